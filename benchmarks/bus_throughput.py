@@ -0,0 +1,88 @@
+"""
+Benchmark of the instrument bus with each codec.
+Sends sensor-data messages with 256 columns through an inproc PAIR socket, as the sensor does to its director,
+and measures messages per second (encoding and decoding included) and bytes per message.
+Data is sent as dicts, and as rows of declared columns like the sensor does.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import datetime
+import random
+import time
+from threading import Thread
+
+import zmq
+
+from rethebes.instrulib import create_codec
+
+columns = ["Time"] + ["Sensor " + str(i) for i in range(255)]
+messages = 20000
+
+
+def make_message(rows):
+    data = [datetime.datetime.now()] + [random.uniform(0, 100) for _ in columns[1:]]
+    if not rows:
+        data = dict(zip(columns, data))
+        data["Time"] = data["Time"].isoformat()
+    return {
+        "sender": "sensor",
+        "header": "sensor-data",
+        "time": datetime.datetime.now().isoformat(),
+        "body": data,
+    }
+
+
+def receive(codec, socket, count):
+    received = 0
+    while received < count:
+        if codec.recv(socket) is not None:
+            received += 1
+
+
+def measure(name, rows):
+    context = zmq.Context()
+    sender = context.socket(zmq.PAIR)
+    sender.bind("inproc://bus")
+    receiver = context.socket(zmq.PAIR)
+    receiver.connect("inproc://bus")
+    message = make_message(rows)
+    row_columns = columns if rows else None
+
+    # Bytes of all the frames of the last message, so that the schema is excluded
+    codec = create_codec(name)
+    codec.send_data(sender, message, row_columns)
+    codec.send_data(sender, message, row_columns)
+    while receiver.poll(100):
+        size = sum(len(frame) for frame in receiver.recv_multipart())
+
+    encoder = create_codec(name)
+    decoder = create_codec(name)
+    thread = Thread(target=receive, args=(decoder, receiver, messages))
+    start = time.perf_counter()
+    thread.start()
+    for _ in range(messages):
+        encoder.send_data(sender, message, row_columns)
+    thread.join()
+    elapsed = time.perf_counter() - start
+    sender.close()
+    receiver.close()
+    context.term()
+    return messages / elapsed, size
+
+
+def main():
+    for name in ["json", "msgpack", "frame"]:
+        for rows in [False, True]:
+            label = name + (" rows" if rows else "")
+            try:
+                rate, size = measure(name, rows)
+            except ImportError:
+                print(f"{label:<13} not available")
+                break
+            print(f"{label:<13} {rate:>8.0f} messages/s {size:>8d} bytes/message")
+
+
+if __name__ == "__main__":
+    main()
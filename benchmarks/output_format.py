@@ -0,0 +1,68 @@
+"""
+Benchmark of the size and load time of sensor output files, in csv and columnar formats.
+Emulates a run of two hours sampled every 0.1 s with 100 columns.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import datetime
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from rethebes.analysis.compare import compare_columns
+from rethebes.analysis.util import read_data_from_file
+from rethebes.instruments.sensor.writer import BatchedWriter, ColumnarWriter
+
+rows = 72000
+columns = ["Time"] + compare_columns + ["Sensor " + str(i) for i in range(95)]
+
+
+def write(writer):
+    start = datetime.datetime.now()
+    writer.start()
+    for i in range(rows):
+        row = [start + datetime.timedelta(seconds=0.1 * i)]
+        row += [random.uniform(0, 100) for _ in range(len(columns) - 1)]
+        writer.write(row)
+    writer.close()
+
+
+def size(path):
+    if path.is_dir():
+        return sum(f.stat().st_size for f in path.iterdir())
+    return path.stat().st_size
+
+
+def measure_load(path, selected_columns):
+    start = time.perf_counter()
+    read_data_from_file(path, selected_columns)
+    return time.perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        paths = {
+            "csv": directory / "data.csv",
+            "columnar float64": directory / "data64.columns",
+            "columnar float32": directory / "data32.columns",
+        }
+        write(BatchedWriter(paths["csv"], columns, flush_rows=1000))
+        write(ColumnarWriter(paths["columnar float64"], columns, flush_rows=1000))
+        write(
+            ColumnarWriter(
+                paths["columnar float32"], columns, flush_rows=1000, dtype="float32"
+            )
+        )
+        for name, path in paths.items():
+            print(
+                f"{name:<16} {size(path) / 1e6:>8.1f} MB, load all columns {measure_load(path, None):>6.3f} s, "
+                + f"load compare columns {measure_load(path, compare_columns):>6.3f} s"
+            )
+
+
+if __name__ == "__main__":
+    main()
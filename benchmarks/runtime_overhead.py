@@ -0,0 +1,81 @@
+"""
+Benchmark of the thread and asyncio runtimes of instruments.
+Runs many lightweight instruments that act every 10 ms, and measures how late they act (scheduling latency)
+and the CPU time of the whole process (harness overhead), first with one thread per instrument,
+then as coroutines of one event loop.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import statistics
+import time
+
+import zmq
+
+from rethebes.instrulib import AsyncInstrument, DeadlineClock, Instrument, format_ns
+from rethebes.instruments import AsyncManager, Manager, Timer
+
+tickers = 20
+interval = 0.01
+duration = 3
+
+
+class Ticker:
+    # Acts every interval and records how late it is
+    def open(self):
+        self.clock = DeadlineClock(interval)
+        self.first_run = True
+
+    def get_timeout(self):
+        return 0 if self.first_run else self.clock.get_timeout()
+
+    def run(self):
+        if self.first_run:
+            self.clock.start()
+            self.first_run = False
+        self.clock.tick()
+
+
+class ThreadTicker(Ticker, Instrument):
+    pass
+
+
+class AsyncTicker(Ticker, AsyncInstrument):
+    pass
+
+
+def measure(manager_class, ticker_class):
+    context = zmq.Context(0)
+    instruments = [Timer("timer", context, {"duration": duration})]
+    instruments += [ticker_class("ticker" + str(i), context) for i in range(tickers)]
+    clocks = instruments[1:]
+    manager = manager_class("manager", context, instruments, "timer")
+    start = time.process_time()
+    if manager_class is AsyncManager:
+        import asyncio
+
+        asyncio.run(manager.main())
+    else:
+        manager.main()
+    cpu_time = time.process_time() - start
+    context.term()
+    p50 = statistics.median(t.clock.lateness.percentile(50) for t in clocks)
+    p99 = max(t.clock.lateness.percentile(99) for t in clocks)
+    return p50, p99, cpu_time
+
+
+def main():
+    for name, manager_class, ticker_class in [
+        ("thread", Manager, ThreadTicker),
+        ("asyncio", AsyncManager, AsyncTicker),
+    ]:
+        p50, p99, cpu_time = measure(manager_class, ticker_class)
+        print(
+            f"{name:<8} lateness p50 = {format_ns(p50)}, worst p99 = {format_ns(p99)}, "
+            + f"CPU time {cpu_time:.3f} s in {duration} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
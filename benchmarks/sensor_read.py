@@ -0,0 +1,146 @@
+"""
+Benchmark of the cost of reading one sample of sensors.
+Compares the original reading logic (all sensors, dict rebuilt and copied at each sample)
+with subscriptions compiled to a list of indexes and read into a preallocated row.
+Hardware is emulated so that only the cost on the python side is measured,
+on Linux the native backend is measured too.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import datetime
+import sys
+import time
+
+from rethebes.instruments.sensor.cpu import CPU
+from rethebes.instruments.sensor.lhm import LHMBackend
+
+cores = 32
+samples = 20000
+analysis_subscriptions = {
+    "Temperature": {},
+    "Load": {"include": ["CPU Total", "CPU Core #* Thread #*"]},
+    "Power": {},
+}
+
+
+class FakeSensor:
+    def __init__(self, stype, name):
+        self.SensorType = stype
+        self.Name = name
+        self.Value = 1.0
+
+
+class FakeSensors:
+    # Emulate the indexer of a .NET array, which costs a call at every access
+    def __init__(self, sensors):
+        self.sensors = sensors
+
+    def __getitem__(self, index):
+        return self.sensors[index]
+
+
+class FakeHardware:
+    def __init__(self):
+        sensors = []
+        for stype in ["Clock", "Temperature", "Voltage", "Power"]:
+            for i in range(cores):
+                sensors.append(FakeSensor(stype, "CPU Core #" + str(i + 1)))
+        for i in range(cores):
+            sensors.append(
+                FakeSensor(
+                    "Temperature", "CPU Core #" + str(i + 1) + " Distance to TjMax"
+                )
+            )
+            for j in range(2):
+                name = "CPU Core #" + str(i + 1) + " Thread #" + str(j + 1)
+                sensors.append(FakeSensor("Load", name))
+        for stype, name in [
+            ("Temperature", "CPU Package"),
+            ("Temperature", "Core Max"),
+            ("Temperature", "Core Average"),
+            ("Load", "CPU Total"),
+            ("Power", "CPU Package"),
+            ("Power", "CPU Cores"),
+        ]:
+            sensors.append(FakeSensor(stype, name))
+        self.Sensors = FakeSensors(sensors)
+
+    def Update(self):
+        pass
+
+
+def legacy_read(hw):
+    # Reproduces CPU.read() and Sensor.act() before subscriptions were introduced
+    sensors = dict()
+    index = 0
+    while True:
+        try:
+            sensor = hw.Sensors[index]
+        except IndexError:
+            break
+        sensors[str(sensor.SensorType) + " " + str(sensor.Name)] = index
+        index += 1
+    latest_values = {}
+
+    def sample():
+        hw.Update()
+        for key, index in sensors.items():
+            latest_values[key] = hw.Sensors[index].Value
+        values = {"Time": datetime.datetime.now().isoformat()}
+        values.update(latest_values)
+        return list(values.values())
+
+    return sample, len(sensors)
+
+
+def subscribed_read(backend, subscriptions):
+    cpu = CPU(backend, subscriptions)
+    row = [None] * (len(cpu.names) + 1)
+
+    def sample():
+        row[0] = datetime.datetime.now().isoformat()
+        cpu.read(row, 1)
+        return row
+
+    return sample, len(cpu.names)
+
+
+def measure(name, sample, columns):
+    start = time.perf_counter()
+    for _ in range(samples):
+        sample()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<40} {columns:>5} columns {elapsed / samples * 1e6:>10.2f} us/sample")
+
+
+def lhm_backend(hw):
+    backend = LHMBackend()
+    backend.hw = hw
+    return backend
+
+
+def main():
+    hw = FakeHardware()
+    measure("Emulated LHM, legacy", *legacy_read(hw))
+    measure("Emulated LHM, all sensors", *subscribed_read(lhm_backend(hw), "all"))
+    measure(
+        "Emulated LHM, analysis sensors",
+        *subscribed_read(lhm_backend(hw), analysis_subscriptions),
+    )
+    if sys.platform.startswith("linux"):
+        from rethebes.instruments.sensor.linux import LinuxBackend
+
+        for name, subscriptions in [
+            ("Linux, all sensors", "all"),
+            ("Linux, analysis sensors", analysis_subscriptions),
+        ]:
+            backend = LinuxBackend()
+            backend.open()
+            measure(name, *subscribed_read(backend, subscriptions))
+            backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark of writing sensor rows to file.
+Compares the cost paid by the sampling loop when rows are written synchronously with csv.writer
+and when they are handed to the background BatchedWriter, sampling at 1 kHz with 256 columns.
+Then measures the maximum throughput that the background writer sustains.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import csv
+import datetime
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from rethebes.instrulib import DeadlineClock
+from rethebes.instruments.sensor.writer import BatchedWriter
+
+columns = ["Time"] + ["Sensor " + str(i) for i in range(255)]
+sampling_interval = 0.001
+duration = 5
+
+
+def make_row():
+    return [datetime.datetime.now()] + [
+        random.uniform(0, 100) for _ in range(len(columns) - 1)
+    ]
+
+
+def sample_at_rate(write):
+    # Returns the time spent in write per row and the clock, for lateness
+    clock = DeadlineClock(sampling_interval)
+    clock.start()
+    spent = 0
+    rows = 0
+    stop = time.monotonic() + duration
+    while time.monotonic() < stop:
+        time.sleep(clock.get_timeout())
+        clock.tick()
+        row = make_row()
+        start = time.perf_counter()
+        write(row)
+        spent += time.perf_counter() - start
+        rows += 1
+    return spent / rows, rows, clock
+
+
+def synchronous(path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, delimiter=",")
+        writer.writerow(columns)
+        return sample_at_rate(writer.writerow)
+
+
+def check(writer):
+    # The thread keeps its errors, after which rows are discarded and throughput is meaningless
+    if writer.error is not None:
+        raise RuntimeError("BatchedWriter failed: " + repr(writer.error))
+
+
+def batched(path):
+    writer = BatchedWriter(path, columns)
+    writer.start()
+    result = sample_at_rate(writer.write)
+    writer.close()
+    check(writer)
+    return result
+
+
+def maximum_throughput(path, rows=50000):
+    block = [make_row() for _ in range(1000)]
+    writer = BatchedWriter(path, columns, flush_rows=1000)
+    start = time.perf_counter()
+    writer.start()
+    for i in range(rows):
+        # A fresh row for each write, like the copy of the sensor, because the writer formats it in place
+        writer.write(block[i % len(block)].copy())
+    writer.close()
+    check(writer)
+    return writer.rows_written / (time.perf_counter() - start)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        for name, function in [("csv.writer", synchronous), ("BatchedWriter", batched)]:
+            cost, rows, clock = function(directory / (name + ".csv"))
+            print(
+                f"{name:<15} {rows / duration:>8.0f} rows/s {cost * 1e6:>8.2f} us/row in sampling loop, lateness: "
+                + clock.report()
+            )
+        throughput = maximum_throughput(directory / "throughput.csv")
+        print(f"BatchedWriter maximum throughput: {throughput:.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,6 @@ import logging
 
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
 
 from .util import (
@@ -22,7 +21,7 @@ from .util import (
     get_best_tick_interval,
     get_number_of_cores,
     read_data_from_file,
-    window_in_seconds,
+    rolling,
 )
 
 
@@ -107,19 +106,17 @@ def plot_temp_vs_load(data, axis):
     axis.text(
         0.05, 0.95, txt, transform=axis.transAxes, fontsize=8, ha="left", va="top"
     )
-    delta_t = data["Time"].diff().mean() / np.timedelta64(1, "s")
-    window = int(window_in_seconds / delta_t)
     axis.plot(
-        data["Load CPU Total"].rolling(window).mean(),
-        data["Temperature Core Average"].rolling(window).mean(),
+        rolling(data, "Load CPU Total"),
+        rolling(data, "Temperature Core Average"),
         color="g",
         marker=".",
         linestyle="none",
         label="Avg",
     )
     axis.plot(
-        data["Load CPU Total"].rolling(window).mean(),
-        data["Temperature Core Max"].rolling(window).mean(),
+        rolling(data, "Load CPU Total"),
+        rolling(data, "Temperature Core Max"),
         color="r",
         marker=".",
         linestyle="none",
@@ -138,20 +135,17 @@ def plot_temp_vs_power(data, axis):
     axis.text(
         0.05, 0.95, txt, transform=axis.transAxes, fontsize=8, ha="left", va="top"
     )
-    delta_t = data["Time"].diff().mean() / np.timedelta64(1, "s")
-    window = int(window_in_seconds / delta_t)
     axis.plot(
-        data["Power CPU Cores"].rolling(window).mean(),
-        data["Temperature Core Average"].rolling(window).mean(),
+        rolling(data, "Power CPU Cores"),
+        rolling(data, "Temperature Core Average"),
         color="g",
         marker=".",
         linestyle="none",
         label="Avg",
     )
     axis.plot(
-        data["Power CPU Cores"].rolling(window).mean(),
-        analysis_result["m"] * data["Power CPU Cores"].rolling(window).mean()
-        + analysis_result["q"],
+        rolling(data, "Power CPU Cores"),
+        analysis_result["m"] * rolling(data, "Power CPU Cores") + analysis_result["q"],
         color="k",
         label="Fit",
     )
@@ -163,11 +157,9 @@ def plot_temp_vs_power(data, axis):
 
 
 def plot_time_load_temp(data, axis):
-    delta_t = data["Time"].diff().mean() / np.timedelta64(1, "s")
-    window = int(window_in_seconds / delta_t)
     axis.plot(
         data["Time"],
-        data["Load CPU Total"].rolling(window).mean(),
+        rolling(data, "Load CPU Total"),
         color="0.5",
         marker=".",
         linestyle="none",
@@ -176,7 +168,7 @@ def plot_time_load_temp(data, axis):
     axistwin = axis.twinx()
     axistwin.plot(
         data["Time"],
-        data["Temperature Core Average"].rolling(window).mean(),
+        rolling(data, "Temperature Core Average"),
         color="g",
         marker=".",
         linestyle="none",
@@ -184,7 +176,7 @@ def plot_time_load_temp(data, axis):
     )
     axistwin.plot(
         data["Time"],
-        data["Temperature Core Max"].rolling(window).mean(),
+        rolling(data, "Temperature Core Max"),
         color="r",
         marker=".",
         linestyle="none",
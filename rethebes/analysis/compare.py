@@ -11,7 +11,6 @@ from pathlib import Path
 
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
 from matplotlib import colormaps
 
@@ -21,8 +20,17 @@ from .util import (
     check_if_data_complete,
     hex_string_from_rgba,
     read_data_from_file,
+    rolling,
 )
 
+# The only columns needed by comparisons
+compare_columns = [
+    "Temperature CPU Package",
+    "Temperature Core Average",
+    "Load CPU Total",
+    "Power CPU Cores",
+]
+
 
 def format_base_axis(axis):
     axis.grid()
@@ -31,11 +39,9 @@ def format_base_axis(axis):
 
 
 def plot_temp_vs_load(data, axis, name=None, color=None, alpha=None):
-    delta_t = data["Time"].diff().mean() / np.timedelta64(1, "s")
-    window = int(10 / delta_t)
     axis.plot(
-        data["Load CPU Total"].rolling(window).mean(),
-        data["Temperature Core Average"].rolling(window).mean(),
+        rolling(data, "Load CPU Total", 10),
+        rolling(data, "Temperature Core Average", 10),
         marker=".",
         color=color,
         alpha=alpha,
@@ -47,11 +53,9 @@ def plot_temp_vs_load(data, axis, name=None, color=None, alpha=None):
 
 
 def plot_temp_vs_power(data, axis, name=None, color=None, alpha=None):
-    delta_t = data["Time"].diff().mean() / np.timedelta64(1, "s")
-    window = int(10 / delta_t)
     axis.plot(
-        data["Power CPU Cores"].rolling(window).mean(),
-        data["Temperature Core Average"].rolling(window).mean(),
+        rolling(data, "Power CPU Cores", 10),
+        rolling(data, "Temperature Core Average", 10),
         marker=".",
         color=color,
         alpha=alpha,
@@ -165,7 +169,7 @@ def compare(file_names):
     # Check if all files are complete
     data_list = []
     for file_name in file_names:
-        data_list.append(read_data_from_file(file_name))
+        data_list.append(read_data_from_file(file_name, compare_columns))
     complete = [check_if_data_complete(d) for d in data_list]
     if not all(complete):
         logging.critical("Can only run the comparison on complete data")
@@ -5,6 +5,11 @@ Authors: Giulio Foletto.
 License: See project-level license file.
 """
 
+import datetime
+import json
+import re
+from pathlib import Path
+
 import matplotlib.dates as mdates
 import numpy as np
 import pandas as pd
@@ -12,8 +17,54 @@ import pandas as pd
 window_in_seconds = 5
 
 
-def read_data_from_file(file_name):
-    return pd.read_csv(file_name, delimiter=",", parse_dates=["Time"])
+def read_data_from_file(file_name, columns=None):
+    # Selecting columns (other than Time, which is always read) saves time and memory
+    path = Path(file_name)
+    if path.is_dir():
+        return read_data_from_columns(path, columns)
+    usecols = None if columns is None else ["Time"] + columns
+    return pd.read_csv(file_name, delimiter=",", parse_dates=["Time"], usecols=usecols)
+
+
+def read_data_from_columns(path, columns=None):
+    # See ColumnarWriter for the format
+    with open(path / "schema.json") as f:
+        schema = json.load(f)
+    all_columns = schema["columns"]
+    if columns is None:
+        columns = all_columns[1:]
+    data = dict()
+    data["Time"] = np.fromfile(path / "0.bin", dtype=np.int64)
+    for column in columns:
+        index = all_columns.index(column)
+        data[column] = np.fromfile(path / (str(index) + ".bin"), dtype=schema["dtype"])
+    # If the writer was interrupted, the last block might be incomplete in some columns
+    length = min(len(values) for values in data.values())
+    for column in data:
+        data[column] = data[column][:length]
+    # Time is stored as ns since the epoch, but analysis uses local time like csv files
+    data["Time"] = local_time_from_ns(data["Time"])
+    return pd.DataFrame(data)
+
+
+def local_time_from_ns(ns):
+    time = pd.to_datetime(ns, unit="ns", utc=True)
+    if len(time) == 0:
+        return time.tz_localize(None)
+    offsets = [
+        datetime.datetime.fromtimestamp(t.timestamp()).astimezone().utcoffset()
+        for t in [time[0], time[-1]]
+    ]
+    if offsets[0] == offsets[1]:
+        # Converting with a constant offset is much faster than converting to local time zone
+        return time.tz_localize(None) + offsets[0]
+    # Offsets change at most on quarter hours, so they are computed once per quarter hour
+    quarters = time.floor("15min")
+    offsets = {
+        q: datetime.datetime.fromtimestamp(q.timestamp()).astimezone().utcoffset()
+        for q in quarters.unique()
+    }
+    return time.tz_localize(None) + pd.to_timedelta(quarters.map(offsets))
 
 
 def check_if_data_complete(data):
@@ -24,9 +75,11 @@ date_format = mdates.DateFormatter("%H:%M:%S")
 
 
 def get_number_of_cores(data):
-    return (",").join(list(data.columns)).count(
-        "Temperature CPU Core"
-    ) // 2  # //2 because of presence of distance to tjmax
+    # Match whole names, since other columns (distance to TjMax, aggregated statistics) extend them
+    return sum(
+        re.fullmatch(r"Temperature CPU Core #\d+", column) is not None
+        for column in data.columns
+    )
 
 
 def get_best_tick_interval(data):
@@ -64,19 +117,28 @@ def format_standard_axis(data, axis):
     axis.set_xlabel("Time")
 
 
+def rolling(data, column, seconds=window_in_seconds, statistic="mean"):
+    # Windows span a duration rather than a number of samples, because sampling can be non-uniform
+    # Like with a number of samples, the result is NaN until the first window is full
+    result = getattr(
+        data.rolling(pd.Timedelta(seconds=seconds), on="Time")[column], statistic
+    )()
+    return result.where(
+        data["Time"] - data["Time"].iloc[0] >= pd.Timedelta(seconds=seconds)
+    )
+
+
 def get_average_load_core(data, core_index):
     valid_columns = []
     for column in data.columns:
-        if ("Load CPU Core #" + str(core_index) + " Thread #") in column:
+        if re.fullmatch(r"Load CPU Core #" + str(core_index) + r" Thread #\d+", column):
             valid_columns.append(column)
     return data[valid_columns].mean(axis=1)
 
 
 def analyze_temp_vs_load(data):
-    delta_t = data["Time"].diff().mean() / np.timedelta64(1, "s")
-    window = int(window_in_seconds / delta_t)
-    x = data["Load CPU Total"].rolling(window).mean()
-    y = data["Temperature Core Average"].rolling(window).mean()
+    x = rolling(data, "Load CPU Total")
+    y = rolling(data, "Temperature Core Average")
     if len(x[x.notna()]) < 2 or len(y[y.notna()]) < 2:
         return dict(
             l95=np.nan,
@@ -105,11 +167,9 @@ def analyze_temp_vs_load(data):
 
 
 def analyze_temp_vs_power(data):
-    delta_t = data["Time"].diff().mean() / np.timedelta64(1, "s")
-    window = int(window_in_seconds / delta_t)
-    x = data["Power CPU Cores"].rolling(window).mean()
-    y = data["Temperature Core Average"].rolling(window).mean()
-    sigmay = data["Temperature Core Average"].rolling(window).std()
+    x = rolling(data, "Power CPU Cores")
+    y = rolling(data, "Temperature Core Average")
+    sigmay = rolling(data, "Temperature Core Average", statistic="std")
     # Use range rather than percentiles because non-uniform distributions are more likely than outliers
     p95 = x.min() + 0.95 * (x.max() - x.min())
     p05 = x.min() + 0.05 * (x.max() - x.min())
@@ -13,8 +13,8 @@ import click
 
 from rethebes.util import (
     configure_logging,
+    find_output_file,
     get_default_config_directory,
-    get_default_output_directory,
 )
 
 
@@ -58,17 +58,8 @@ def analyze_command(data_file):
     """Analyze DATA_FILE."""
     from rethebes.analysis import analysis
 
-    candidates = [
-        Path(data_file).resolve(),
-        get_default_output_directory() / data_file,
-        get_default_output_directory() / (data_file + ".csv"),
-    ]
-    analysis_file_found = False
-    for path in candidates:
-        if path.exists():
-            analysis_file_found = True
-            break
-    if not analysis_file_found:
+    path = find_output_file(data_file)
+    if path is None:
         logging.critical("File to analyze " + str(data_file) + " not found")
         return
     analysis(path)
@@ -90,22 +81,22 @@ def compare_command(data_files):
         return
     files = []
     for file in data_files:
-        candidates = [
-            Path(file).resolve(),
-            get_default_output_directory() / file,
-            get_default_output_directory() / (file + ".csv"),
-        ]
-        analysis_file_found = False
-        for path in candidates:
-            if path.exists():
-                analysis_file_found = True
-                files.append(path)
-                break
-        if not analysis_file_found:
+        path = find_output_file(file)
+        if path is None:
             logging.critical("File to compare " + str(file) + " not found")
             return
+        files.append(path)
     compare(files)
 
 
+@cli.command(name="agent")
+@click.argument("endpoint", default="tcp://*:5555")
+def agent_command(endpoint):
+    """Host instruments of remote runs on ENDPOINT."""
+    from rethebes.run import serve
+
+    serve(endpoint)
+
+
 if __name__ == "__main__":
     cli()
@@ -1,2 +1,7 @@
+from .asynchronous import AsyncDirector, AsyncInstrument
+from .clock import DeadlineClock, Histogram, format_ns
+from .codec import FrameCodec, JSONCodec, MsgpackCodec, create_codec
+from .data_plane import DataPlane, connect_subscriber
 from .director import Director
 from .instrument import Instrument
+from .remote import Agent, RemoteInstrument, estimate_offset
@@ -0,0 +1,159 @@
+"""
+Asyncio runtime for instruments, where many instruments share one thread as coroutines of an event loop.
+AsyncInstrument has the same lifecycle and messages as Instrument, and its hooks (open, wait, run, close)
+can be coroutines or plain functions.
+AsyncDirector runs AsyncInstrument subordinates as tasks and other subordinates unmodified in their own threads,
+receiving from the sockets of both in the event loop.
+Sockets are those of zmq.asyncio, on a shadow of the context of the instruments, so that inproc endpoints are shared.
+This runtime is experimental.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import asyncio
+import inspect
+import time
+
+import zmq
+import zmq.asyncio
+
+from .director import Director
+from .instrument import Instrument
+
+
+async def call(function, *args):
+    result = function(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class AsyncInstrument(Instrument):
+    # The poller only lists the sockets to receive from, and sends complete without waiting
+    def get_socket_context(self):
+        if not hasattr(self, "async_context"):
+            self.async_context = zmq.asyncio.Context.shadow(self.context)
+        return self.async_context
+
+    async def main(self):
+        if not self.sockets_ready:
+            self.init_sockets()
+        # A receive is kept pending on each socket across calls of listen
+        self.receptions = dict()
+        self.waker = None
+        try:
+            while True:
+                state = self.state
+                if state == "opening":
+                    await call(self.open)
+                    self.set_state("waiting")
+                    self.send_event(
+                        command="ready", subscribed_headers=self.subscribed_headers
+                    )
+                elif state == "waiting":
+                    await call(self.wait)
+                elif state == "running":
+                    timeout = self.get_timeout()
+                    if timeout is None:
+                        await self.listen()
+                        continue
+                    # Conversion to ms, not rounded, because the event loop rounds the wait
+                    await self.listen(timeout * 1000)
+                    if self.state == "running" and self.get_timeout() == 0:
+                        await call(self.run)
+                elif state == "closing":
+                    await call(self.close)
+                    break
+                else:
+                    raise ValueError("Unknown state: " + state)
+        except asyncio.CancelledError:
+            # Cancelled with the event loop, e.g. on CTRL+C
+            await call(self.abort)
+            self.release()
+            raise
+        self.release()
+
+    def abort(self):
+        pass
+
+    async def wait(self):
+        await self.listen()
+
+    async def listen(self, timeout=None):
+        # Closed sockets cancel their receive
+        sockets = [s for s, flags in self.poller.sockets if not s.closed]
+        for socket in list(self.receptions):
+            if socket not in sockets:
+                del self.receptions[socket]
+        for socket in sockets:
+            if socket not in self.receptions:
+                reception = socket.recv_multipart()
+                reception.add_done_callback(self.wake)
+                self.receptions[socket] = reception
+        if not any(r.done() for r in self.receptions.values()):
+            # Woken by the first receive that completes, or by the timeout
+            loop = asyncio.get_running_loop()
+            self.waker = loop.create_future()
+            timer = None
+            if timeout is not None:
+                timer = loop.call_later(timeout / 1000, self.wake)
+            await self.waker
+            if timer is not None:
+                timer.cancel()
+        for socket in sockets:
+            reception = self.receptions.get(socket)
+            if reception is None or not reception.done():
+                continue
+            del self.receptions[socket]
+            if not socket.closed and not reception.cancelled():
+                self.receive(socket, self.codec.decode(socket, reception.result()))
+
+    def wake(self, *args):
+        if self.waker is not None and not self.waker.done():
+            self.waker.set_result(None)
+
+
+class AsyncDirector(AsyncInstrument, Director):
+    def start_subordinate(self, subordinate):
+        if isinstance(subordinate, AsyncInstrument):
+            return asyncio.create_task(subordinate.main())
+        return super().start_subordinate(subordinate)
+
+    async def open(self):
+        super().open()
+        # Let the tasks connect their sockets, otherwise sending to them would block the event loop
+        await asyncio.sleep(0)
+
+    async def main(self):
+        # The CPU time of the director includes that of its asynchronous subordinates
+        self.start_cpu_time_ns = time.thread_time_ns()
+        self.closure_requested = False
+        await super().main()
+
+    async def abort(self):
+        # CTRL+C, the subordinates close before the cancellation goes on
+        self.send_event(command="close")
+        await self.join_subordinates()
+
+    async def wait(self):
+        if self.check_should_continue():
+            await self.listen()  # Exit only with a message
+            if self.closure_requested:
+                await self.join_subordinates()
+        else:
+            self.set_state("closing")
+
+    def wait_for_closure(self):
+        # Called while processing messages, which cannot wait for tasks
+        self.closure_requested = True
+
+    async def join_subordinates(self):
+        for name in list(self.threads.keys()):
+            worker = self.threads[name]
+            if isinstance(worker, asyncio.Task):
+                await worker
+            else:
+                await asyncio.to_thread(worker.join)
+            self.forget_subordinate(name)
+        self.closure_requested = False
@@ -0,0 +1,104 @@
+"""
+Clock that schedules periodic actions at absolute deadlines, and records how late they are.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import datetime
+import time
+
+
+class DeadlineClock:
+    def __init__(self, interval, catch_up=False):
+        self.interval_ns = int(interval * 1e9)
+        # If catch_up, missed ticks are executed as soon as possible, otherwise they are skipped and counted
+        self.catch_up = catch_up
+        self.lateness = Histogram()
+        self.ticks = 0
+        self.missed_ticks = 0
+
+    def start(self):
+        # Deadlines are absolute and on the monotonic clock, so that delays do not accumulate and wall clock steps do not matter
+        # The wall clock is read only here, to convert monotonic times to timestamps
+        self.start_ns = time.monotonic_ns()
+        self.start_wall_ns = time.time_ns()
+        self.deadline_ns = self.start_ns
+
+    def set_interval(self, interval):
+        # The next deadline moves to one new interval after the last tick, so that a shorter interval applies at once
+        interval_ns = int(interval * 1e9)
+        if hasattr(self, "deadline_ns"):
+            self.deadline_ns += interval_ns - self.interval_ns
+        self.interval_ns = interval_ns
+
+    def get_timeout(self):
+        # Seconds until the next deadline, 0 if it has passed
+        return max(0, self.deadline_ns - time.monotonic_ns()) / 1e9
+
+    def tick(self):
+        # To be called when the deadline has passed, returns the monotonic time of the tick in ns
+        now = time.monotonic_ns()
+        self.lateness.add(max(0, now - self.deadline_ns))
+        self.ticks += 1
+        self.deadline_ns += self.interval_ns
+        if not self.catch_up and now >= self.deadline_ns:
+            missed = (now - self.deadline_ns) // self.interval_ns + 1
+            self.missed_ticks += missed
+            self.deadline_ns += missed * self.interval_ns
+        return now
+
+    def to_timestamp(self, monotonic_ns):
+        # Seconds since the epoch
+        return (self.start_wall_ns + monotonic_ns - self.start_ns) / 1e9
+
+    def to_datetime(self, monotonic_ns):
+        return datetime.datetime.fromtimestamp(self.to_timestamp(monotonic_ns))
+
+    def report(self):
+        return (
+            "p50 = "
+            + format_ns(self.lateness.percentile(50))
+            + ", p99 = "
+            + format_ns(self.lateness.percentile(99))
+            + ", max = "
+            + format_ns(self.lateness.max)
+            + ", missed ticks = "
+            + str(self.missed_ticks)
+            + " of "
+            + str(self.ticks + self.missed_ticks)
+        )
+
+
+class Histogram:
+    # Histogram of non-negative integers with constant memory
+    # Buckets are exact below 2**bits, then each power of two is split in 2**(bits - 1) buckets
+    # so that the relative error of percentiles is below 2**(1 - bits)
+    def __init__(self, bits=5):
+        self.bits = bits
+        self.counts = dict()
+        self.count = 0
+        self.max = 0
+
+    def add(self, value):
+        shift = max(0, value.bit_length() - self.bits)
+        bucket = (value >> shift) << shift
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        # Returns the lower bound of the bucket that contains the percentile
+        if self.count == 0:
+            return 0
+        threshold = p / 100 * self.count
+        cumulative = 0
+        for bucket in sorted(self.counts):
+            cumulative += self.counts[bucket]
+            if cumulative >= threshold:
+                return bucket
+        return self.max
+
+
+def format_ns(value):
+    return f"{value / 1e6:.3f} ms"
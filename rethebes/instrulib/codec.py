@@ -0,0 +1,150 @@
+"""
+Codecs that encode the messages exchanged between instruments and their director.
+All the instruments of a director must use the same codec.
+JSONCodec is the default, MsgpackCodec needs the optional package msgpack,
+FrameCodec sends data as a binary buffer of floats, after sending the names of the columns once.
+Data can be a dict, or a row of declared columns that starts with Time as a datetime, which receivers get as a dict.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import datetime
+import json
+import math
+
+import numpy as np
+
+
+def create_codec(name):
+    if name == "json":
+        return JSONCodec()
+    elif name == "msgpack":
+        return MsgpackCodec()
+    elif name == "frame":
+        return FrameCodec()
+    else:
+        raise ValueError("Unknown codec: " + name)
+
+
+def row_to_body(columns, row):
+    body = dict(zip(columns, row))
+    body[columns[0]] = row[0].isoformat()
+    return body
+
+
+class JSONCodec:
+    name = "json"
+
+    def send(self, socket, message):
+        socket.send_json(message)
+
+    def send_data(self, socket, message, columns=None):
+        # Data messages have a body made of columns, which some codecs encode differently
+        # With columns, the body is a row of their values
+        if columns is not None:
+            message = dict(message, body=row_to_body(columns, message["body"]))
+        self.send(socket, message)
+
+    def recv(self, socket):
+        # Returns None if the message is only for the codec
+        return self.decode(socket, socket.recv_multipart())
+
+    def decode(self, socket, frames):
+        # For frames already received from socket, e.g. by an asyncio socket
+        return json.loads(frames[0])
+
+
+class MsgpackCodec(JSONCodec):
+    name = "msgpack"
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError as e:
+            raise ImportError(
+                "The msgpack codec requires the package msgpack, "
+                + "which is installed with pip install rethebes[msgpack]"
+            ) from e
+        self.msgpack = msgpack
+
+    def send(self, socket, message):
+        socket.send(self.msgpack.packb(message))
+
+    def decode(self, socket, frames):
+        return self.msgpack.unpackb(frames[0])
+
+
+class FrameCodec(JSONCodec):
+    # A data message is sent as two frames: the json envelope, with the text columns, and a buffer of float64
+    # The schema, i.e. the names of text and numeric columns, is sent before the first data message
+    # of each header, whenever the columns change, and every schema_interval messages for late subscribers
+    # Data messages are discarded by receivers until they receive their schema
+    # Columns are classified as text or numeric by the first value sent, None becomes NaN and vice versa
+    # The schema of rows is recognized by the identity of their columns, and their Time is sent as a timestamp
+    name = "frame"
+
+    def __init__(self, schema_interval=100):
+        self.schema_interval = schema_interval
+        self.sent_schemas = dict()
+        self.sent_counts = dict()
+        self.received_schemas = dict()
+
+    def send_data(self, socket, message, columns=None):
+        body = message["body"]
+        key = (socket, message["sender"], message["header"])
+        schema = self.sent_schemas.get(key)
+        count = self.sent_counts.get(key, 0)
+        self.sent_counts[key] = count + 1
+        resend = schema is None or count % self.schema_interval == 0
+        if columns is not None:
+            if resend or schema[0] is not columns:
+                schema = (columns, [], list(columns))
+                self.send_schema(socket, message, schema, columns[0])
+            text = []
+            values = np.array([body[0].timestamp()] + body[1:], dtype=np.float64)
+        else:
+            columns = tuple(body)
+            if resend or schema[0] != columns:
+                text = [c for c in columns if isinstance(body[c], str)]
+                numeric = [c for c in columns if not isinstance(body[c], str)]
+                schema = (columns, text, numeric)
+                self.send_schema(socket, message, schema)
+            text = [body[c] for c in schema[1]]
+            values = np.array([body[c] for c in schema[2]], dtype=np.float64)
+        envelope = {k: v for k, v in message.items() if k != "body"}
+        envelope["text"] = text
+        socket.send_multipart([json.dumps(envelope).encode(), values], copy=False)
+
+    def send_schema(self, socket, message, schema, time=None):
+        # time is the numeric column that receivers convert from timestamp to text, if any
+        self.sent_schemas[(socket, message["sender"], message["header"])] = schema
+        socket.send_json(
+            {
+                "sender": message["sender"],
+                "header": message["header"],
+                "schema": {"text": schema[1], "numeric": schema[2], "time": time},
+            }
+        )
+
+    def decode(self, socket, frames):
+        message = json.loads(frames[0])
+        key = (socket, message["sender"], message["header"])
+        if "schema" in message:
+            self.received_schemas[key] = message["schema"]
+            return None
+        if len(frames) == 1:
+            return message
+        schema = self.received_schemas.get(key)
+        if schema is None:
+            return None
+        body = dict(zip(schema["text"], message.pop("text")))
+        values = np.frombuffer(frames[1], dtype=np.float64).tolist()
+        body.update(
+            zip(schema["numeric"], [None if math.isnan(v) else v for v in values])
+        )
+        if schema["time"] is not None:
+            time = schema["time"]
+            body[time] = datetime.datetime.fromtimestamp(body[time]).isoformat()
+        message["body"] = body
+        return message
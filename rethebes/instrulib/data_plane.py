@@ -0,0 +1,53 @@
+"""
+Publish/subscribe data plane, separate from the PAIR sockets that carry commands and events.
+Instruments publish data to an XSUB/XPUB proxy owned by their director, and any number of instruments can subscribe.
+Publishing never blocks: when the queue of a slow subscriber is full, messages to it are dropped,
+and the subscriber counts them by the gaps in the sequence numbers of each publisher.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+from threading import Thread
+
+import zmq
+
+
+class DataPlane(Thread):
+    def __init__(self, name, context, hwm=1):
+        # hwm is the number of messages queued in the proxy for each subscriber
+        # It is small, so that queues are sized by the hwm of each subscriber
+        self.input_endpoint = "inproc://" + name + "-data-input"
+        self.output_endpoint = "inproc://" + name + "-data-output"
+        # Sockets are bound here, so that instruments can connect before the proxy runs
+        self.frontend = context.socket(zmq.XSUB)
+        self.frontend.bind(self.input_endpoint)
+        self.backend = context.socket(zmq.XPUB)
+        self.backend.setsockopt(zmq.SNDHWM, hwm)
+        self.backend.bind(self.output_endpoint)
+        self.control = context.socket(zmq.PAIR)
+        self.control.bind("inproc://" + name + "-data-control")
+        self.controller = context.socket(zmq.PAIR)
+        self.controller.connect("inproc://" + name + "-data-control")
+        super().__init__(name=name + "-data")
+
+    def run(self):
+        zmq.proxy_steerable(self.frontend, self.backend, None, self.control)
+        for s in [self.frontend, self.backend, self.control]:
+            s.close()
+
+    def close(self):
+        self.controller.send(b"TERMINATE")
+        self.join()
+        self.controller.close()
+
+
+def connect_subscriber(context, endpoint, hwm=1000, conflate=False):
+    # With conflate, only the last message is kept, which requires single frame messages (not the frame codec)
+    socket = context.socket(zmq.SUB)
+    socket.setsockopt(zmq.RCVHWM, hwm)
+    if conflate:
+        socket.setsockopt(zmq.CONFLATE, 1)
+    socket.setsockopt(zmq.SUBSCRIBE, b"")
+    socket.connect(endpoint)
+    return socket
@@ -5,49 +5,96 @@ Authors: Giulio Foletto.
 License: See project-level license file.
 """
 
+import datetime
 import logging
+import time
 from threading import Thread
 
 import zmq
 
+from .clock import format_ns
+from .codec import create_codec
+from .data_plane import DataPlane
 from .instrument import Instrument
+from .remote import RemoteInstrument
 
 
 class Director(Instrument):
-    def __init__(self, name, context, subordinates=[]):
+    def __init__(self, name, context, subordinates=[], codec="json"):
         self.subordinates = subordinates
+        for subordinate in subordinates:
+            subordinate.codec = create_codec(codec)
+            subordinate.data_endpoints = (
+                "inproc://" + name + "-data-input",
+                "inproc://" + name + "-data-output",
+            )
         self.threads = dict()
         self.sockets = dict()
         self.ready = dict()
+        self.relays = dict()
+        self.remotes = dict()
         super().__init__(name, context)
+        self.codec = create_codec(codec)
 
     def release(self):
         self.terminate_sockets()
+        self.data_plane.close()
         self.threads.clear()
         self.subordinates.clear()
 
     def init_sockets(self):
-        self.poller = zmq.Poller()
+        self.poller = self.poller_class()
+        context = self.get_socket_context()
         for subordinate in self.subordinates:
-            socket = self.context.socket(zmq.PAIR)
-            socket.bind("inproc://" + subordinate.name)
+            socket = context.socket(zmq.PAIR)
+            if isinstance(subordinate, RemoteInstrument):
+                # Do not wait forever for messages to unreachable agents at closure
+                socket.setsockopt(zmq.LINGER, 1000)
+                socket.connect(subordinate.deploy())
+                self.remotes[socket] = subordinate
+            else:
+                socket.bind(subordinate.endpoint)
             self.sockets[subordinate.name] = socket
             self.poller.register(socket, zmq.POLLIN)
+        # The proxy runs in its own thread, with sockets of the plain context
+        self.data_plane = DataPlane(self.name, self.context)
+        self.data_plane.start()
+        if self.remotes:
+            # Data of remote instruments is published here for local subscribers
+            publisher = context.socket(zmq.PUB)
+            publisher.connect(self.data_plane.input_endpoint)
+            self.data_sockets["publisher"] = publisher
         self.sockets_ready = True
 
     def open(self):
         for subordinate in self.subordinates:
             self.ready[subordinate.name] = False
-            thread = Thread(target=subordinate.main)
-            self.threads[subordinate.name] = thread
-            thread.start()
+            self.threads[subordinate.name] = self.start_subordinate(subordinate)
         logging.info(
             "Program starts - Press CTRL+C to exit (more or less) gracefully or CTRL+BREAK to force exit"
         )
 
+    def start_subordinate(self, subordinate):
+        thread = Thread(target=subordinate.main)
+        thread.start()
+        return thread
+
     def close(self):
+        self.report_cpu_time()
         logging.info("Program ends gracefully")
 
+    def report_cpu_time(self):
+        # CPU time used by the threads of the instruments, excluding their processes
+        times = [
+            self.name + " " + format_ns(time.thread_time_ns() - self.start_cpu_time_ns)
+        ]
+        for subordinate in self.subordinates:
+            if hasattr(subordinate, "cpu_time_ns"):
+                times.append(
+                    subordinate.name + " " + format_ns(subordinate.cpu_time_ns)
+                )
+        logging.info("CPU time of threads: " + ", ".join(times))
+
     def run(self):
         # Should never run
         self.set_state("waiting")
@@ -65,21 +112,56 @@ class Director(Instrument):
             self.send_event(command="close")
             self.wait_for_closure()
             events = []
-        if len(events) > 0:
-            for event in events:
-                if event[0] in self.sockets.values() and event[1] == zmq.POLLIN:
-                    message = event[0].recv_json()
-                    self.process_message(message)
+        for socket, event in events:
+            if event == zmq.POLLIN and not socket.closed:
+                self.receive(socket, self.codec.recv(socket))
+
+    def receive(self, socket, message):
+        if message is None:
+            return
+        if socket in self.remotes:
+            message = self.remotes[socket].correct(message)
+            if "sequence" in message:
+                self.codec.send_data(self.data_sockets["publisher"], message)
+                return
+        self.relay_message(message)
+        self.process_message(message)
+
+    def relay_message(self, message):
+        # Forward the message to the subordinates that subscribed to its header
+        for name, headers in self.relays.items():
+            if (
+                message["header"] in headers
+                and name != message["sender"]
+                and name in self.sockets
+            ):
+                relay = dict()
+                relay["sender"] = self.name
+                relay["header"] = "relay"
+                relay["time"] = datetime.datetime.now().isoformat()
+                relay["body"] = message
+                self.codec.send(self.sockets[name], relay)
 
     def process_message(self, message):
         if "command" in message["body"] and message["body"]["command"] == "critical":
-            self.send_event(command="close")
+            # The cause lets instruments report how fast they reacted
+            self.send_event(command="close", critical=message["body"])
             self.wait_for_closure()
         elif "command" in message["body"] and message["body"]["command"] == "ready":
             self.ready[message["sender"]] = True
+            self.relays[message["sender"]] = message["body"].get(
+                "subscribed_headers", []
+            )
             if self.check_should_send_start():
                 self.send_event(command="start")
 
+    def send_event(self, **kwargs):
+        if kwargs.get("command") == "close":
+            # Remote instruments wait a limited time for their agent from now on
+            for remote in self.remotes.values():
+                remote.close_time = time.monotonic()
+        super().send_event(**kwargs)
+
     def check_should_continue(self):
         return bool(self.threads)
 
@@ -93,7 +175,11 @@ class Director(Instrument):
         names = list(self.threads.keys())
         for name in names:
             self.threads[name].join()
-            self.threads.pop(name)
-            self.sockets[name].close()
-            self.poller.unregister(self.sockets[name])
-            self.sockets.pop(name)
+            self.forget_subordinate(name)
+
+    def forget_subordinate(self, name):
+        # To be called after the subordinate has ended
+        self.threads.pop(name)
+        self.sockets[name].close()
+        self.poller.unregister(self.sockets[name])
+        self.remotes.pop(self.sockets.pop(name), None)
@@ -7,64 +7,118 @@ License: See project-level license file.
 
 import datetime
 import logging
-from threading import Lock
+import math
+import time
 
 import zmq
 
+from .codec import create_codec
+from .data_plane import connect_subscriber
+
 
 class Instrument:
+    poller_class = zmq.Poller
+
     def __init__(self, name, context):
         self.name = name
         self.context = context
-        self.state_lock = Lock()
         self.sockets_ready = False
+        # Headers of messages of other instruments that the director should relay here
+        self.subscribed_headers = []
+        # The director replaces the codec with the one used on its bus
+        self.codec = create_codec("json")
+        # Agents replace the endpoint with a TCP one, which is bound rather than connected
+        self.endpoint = "inproc://" + name
+        # The director sets the input and output endpoints of its data plane, if any
+        self.data_endpoints = None
+        # Subscribers set this to a dict like {"headers": ["sensor-data"], "hwm": 1000, "conflate": False}
+        self.data_subscription = None
+        self.data_sockets = dict()
+        self.data_sequence = 0
+        self.last_sequences = dict()
+        self.data_dropped = 0
         self.set_state("opening")
 
     def release(self):
         self.terminate_sockets()
+        if self.data_dropped > 0:
+            logging.warning(
+                self.name
+                + " could not keep up with data and lost "
+                + str(self.data_dropped)
+                + " messages"
+            )
 
     def set_state(self, state):
-        self.state_lock.acquire()
+        # Assigning and reading an attribute are atomic, so no lock is needed
         self.state = state
-        self.state_lock.release()
 
     def get_state(self):
-        self.state_lock.acquire()
-        state = self.state
-        self.state_lock.release()
-        return state
+        return self.state
 
     def main(self):
-        self.init_sockets()
+        self.start_cpu_time_ns = time.thread_time_ns()
+        if not self.sockets_ready:
+            self.init_sockets()
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
         while True:
-            if (
-                self.sockets_ready
-            ):  # For some instruments, it might make sense to init sockets in open
-                self.listen(0)
-            state = self.get_state()
-            logging.debug(self.name + " in state " + state)
+            state = self.state
+            if debug:
+                logging.debug(self.name + " in state " + state)
             if state == "opening":
                 self.open()
                 self.set_state("waiting")
-                self.send_event(command="ready")
+                self.send_event(
+                    command="ready", subscribed_headers=self.subscribed_headers
+                )
             elif state == "waiting":
                 self.wait()
             elif state == "running":
-                self.run()
+                # Block until the next deadline of run, or until a message arrives
+                timeout = self.get_timeout()
+                if timeout is None:
+                    self.listen()
+                    continue
+                self.listen(math.ceil(timeout * 1000))  # Conversion to ms
+                if self.state == "running" and self.get_timeout() == 0:
+                    self.run()
             elif state == "closing":
                 self.close()
                 break
             else:
                 raise ValueError("Unknown state: " + state)
+        self.cpu_time_ns = time.thread_time_ns() - self.start_cpu_time_ns
         self.release()
 
+    def get_socket_context(self):
+        # Context of the sockets of this instrument, which the asyncio runtime replaces
+        return self.context
+
     def init_sockets(self):
-        socket = self.context.socket(zmq.PAIR)
-        socket.connect("inproc://" + self.name)
+        context = self.get_socket_context()
+        socket = context.socket(zmq.PAIR)
+        if self.endpoint.startswith("inproc://"):
+            socket.connect(self.endpoint)
+        else:
+            socket.bind(self.endpoint)
+            self.endpoint = socket.getsockopt_string(zmq.LAST_ENDPOINT)
         self.sockets = {"main": socket}
-        self.poller = zmq.Poller()
+        self.poller = self.poller_class()
         for s in self.sockets.values():
             self.poller.register(s, zmq.POLLIN)
+        if self.data_endpoints is not None:
+            publisher = context.socket(zmq.PUB)
+            publisher.connect(self.data_endpoints[0])
+            self.data_sockets["publisher"] = publisher
+            if self.data_subscription is not None:
+                subscriber = connect_subscriber(
+                    context,
+                    self.data_endpoints[1],
+                    self.data_subscription.get("hwm", 1000),
+                    self.data_subscription.get("conflate", False),
+                )
+                self.data_sockets["subscriber"] = subscriber
+                self.poller.register(subscriber, zmq.POLLIN)
         self.sockets_ready = True
 
     def terminate_sockets(self):
@@ -72,6 +126,11 @@ class Instrument:
             s.close()
             self.poller.unregister(s)
         self.sockets.clear()
+        if "subscriber" in self.data_sockets:
+            self.poller.unregister(self.data_sockets["subscriber"])
+        for s in self.data_sockets.values():
+            s.close()
+        self.data_sockets.clear()
         self.sockets_ready = False
 
     def open(self):
@@ -83,6 +142,11 @@ class Instrument:
     def run(self):
         pass
 
+    def get_timeout(self):
+        # Seconds until run must be called, 0 to call it as soon as possible,
+        # None if the instrument only reacts to messages while running
+        return 0
+
     def wait(self):
         return self.listen()
 
@@ -92,20 +156,44 @@ class Instrument:
         except KeyboardInterrupt:
             self.set_state("closing")
             events = []
-        if len(events) > 0:
-            for event in events:
-                if event[0] in self.sockets.values() and event[1] == zmq.POLLIN:
-                    message = event[0].recv_json()
-                    self.process_message(message)
+        for socket, event in events:
+            if event == zmq.POLLIN and not socket.closed:
+                self.receive(socket, self.codec.recv(socket))
+
+    def receive(self, socket, message):
+        if message is None:
+            return
+        if socket is self.data_sockets.get("subscriber"):
+            self.receive_data(message)
+        else:
+            self.process_message(message)
 
     def process_message(self, message):
-        if "command" in message["body"] and message["body"]["command"] == "close":
+        if message["header"] == "relay":
+            # Commands of other instruments must not change the state of this one
+            self.process_relayed_message(message["body"])
+        elif "command" in message["body"] and message["body"]["command"] == "close":
             self.set_state("closing")
         elif "command" in message["body"] and message["body"]["command"] == "start":
             self.set_state("running")
         elif "command" in message["body"] and message["body"]["command"] == "stop":
             self.set_state("waiting")
 
+    def process_relayed_message(self, message):
+        pass
+
+    def receive_data(self, message):
+        # Count the messages lost since the last one of the same sender
+        sender = message["sender"]
+        if sender in self.last_sequences:
+            self.data_dropped += message["sequence"] - self.last_sequences[sender] - 1
+        self.last_sequences[sender] = message["sequence"]
+        if message["header"] in self.data_subscription["headers"]:
+            self.process_data_message(message)
+
+    def process_data_message(self, message):
+        pass
+
     def send_event(self, **kwargs):
         event = dict()
         event["sender"] = self.name
@@ -113,7 +201,23 @@ class Instrument:
         event["time"] = datetime.datetime.now().isoformat()
         event["body"] = kwargs
         for s in self.sockets.values():
-            s.send_json(event)
+            self.codec.send(s, event)
+
+    def send_data(self, header, data, columns=None):
+        # data is a dict, or a row of the values of columns, starting with Time as a datetime
+        event = dict()
+        event["sender"] = self.name
+        event["header"] = header
+        event["time"] = datetime.datetime.now().isoformat()
+        event["sequence"] = self.data_sequence
+        event["body"] = data
+        self.data_sequence += 1
+        if "publisher" in self.data_sockets:
+            self.codec.send_data(self.data_sockets["publisher"], event, columns)
+        else:
+            # Without data plane, data goes to the director
+            for s in self.sockets.values():
+                self.codec.send_data(s, event, columns)
 
     def process_internal_error(self, description):
         logging.critical(description)
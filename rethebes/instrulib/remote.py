@@ -0,0 +1,206 @@
+"""
+Instruments hosted on other machines, and controlled by a director over TCP.
+An Agent runs on each remote machine and deploys instruments on request of the director.
+In the director, a RemoteInstrument stands for each of them: it deploys the instrument,
+estimates the offset between the clocks of the two machines with an exchange of pings like NTP,
+and corrects the timestamps of the messages of the instrument, so that they are aligned with the local clock.
+Remote instruments send their data to the director, which publishes it on its data plane,
+but they cannot receive data, which stays on the data plane of the director.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import datetime
+import json
+import logging
+import time
+from threading import Thread
+
+import zmq
+
+from .clock import format_ns
+from .codec import create_codec
+from .instrument import Instrument
+
+pings = 8
+request_timeout = 5  # Seconds to wait for the reply of an agent, except for join
+join_timeout = 10  # Seconds to wait for the end of a remote instrument after closure
+
+
+def estimate_offset(samples):
+    # samples are tuples of times in ns (sent, received by agent, sent by agent, received)
+    # The offset is that of the remote clock with respect to the local one,
+    # estimated by the exchange with the shortest round trip, whose error is at most half of it
+    best = None
+    for t0, t1, t2, t3 in samples:
+        delay = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) // 2
+        if best is None or delay < best[1]:
+            best = (offset, delay)
+    return best
+
+
+def shift_time(text, offset_ns):
+    value = datetime.datetime.fromisoformat(text)
+    return (value - datetime.timedelta(microseconds=offset_ns / 1000)).isoformat()
+
+
+class RemoteInstrument(Instrument):
+    def __init__(self, name, context, address, kind, configuration):
+        # address is that of the agent, like tcp://host:5555, kind is the type of instrument
+        self.address = address
+        self.kind = kind
+        self.configuration = configuration
+        self.offset_ns = 0
+        # Set by the director when it sends close, like time.monotonic()
+        self.close_time = None
+        super().__init__(name, context)
+
+    def deploy(self):
+        # Returns the endpoint to which the director connects
+        self.request = self.context.socket(zmq.REQ)
+        self.request.connect(self.address)
+        samples = []
+        for i in range(pings):
+            t0 = time.time_ns()
+            reply = self.ask(command="ping")
+            t3 = time.time_ns()
+            samples.append((t0, reply["receive_time"], reply["send_time"], t3))
+        self.offset_ns, delay = estimate_offset(samples)
+        logging.info(
+            "Clock offset of "
+            + self.name
+            + " is "
+            + format_ns(self.offset_ns)
+            + " (round trip "
+            + format_ns(delay)
+            + ")"
+        )
+        reply = self.ask(
+            command="deploy",
+            name=self.name,
+            kind=self.kind,
+            configuration=self.configuration,
+            codec=self.codec.name,
+            offset_ns=self.offset_ns,
+        )
+        host = self.address.rsplit(":", 1)[0]
+        return host + ":" + str(reply["port"])
+
+    def ask(self, wait=False, **kwargs):
+        # Paths in the configuration are sent as strings
+        # Unless wait is set, an agent that does not reply within request_timeout is unreachable,
+        # with wait, one that does not reply within join_timeout of the closure
+        self.request.send_string(json.dumps(kwargs, default=str))
+        deadline = None if wait else time.monotonic() + request_timeout
+        while not self.request.poll(100):
+            if wait and self.close_time is not None:
+                deadline = self.close_time + join_timeout
+            if deadline is not None and time.monotonic() > deadline:
+                self.request.setsockopt(zmq.LINGER, 0)
+                self.request.close()
+                raise ConnectionError(
+                    "No reply from agent at "
+                    + self.address
+                    + " to "
+                    + kwargs["command"]
+                    + " in time"
+                )
+        reply = self.request.recv_json()
+        if "error" in reply:
+            raise ValueError("Agent at " + self.address + " failed: " + reply["error"])
+        return reply
+
+    def main(self):
+        # Runs in the thread of the subordinate, and ends when the instrument ends on the agent
+        try:
+            reply = self.ask(True, command="join", name=self.name)
+        except ConnectionError as e:
+            # The agent died during the test, and the director is already closing
+            logging.critical(str(e) + ", " + self.name + " may still be running")
+            return
+        self.cpu_time_ns = reply["cpu_time_ns"]
+        self.request.close()
+
+    def correct(self, message):
+        # Align the times of a message with the local clock
+        message["time"] = shift_time(message["time"], self.offset_ns)
+        if "sequence" in message and "Time" in message["body"]:
+            message["body"]["Time"] = shift_time(
+                message["body"]["Time"], self.offset_ns
+            )
+        return message
+
+
+class Agent:
+    def __init__(self, context, endpoint, known_instruments):
+        self.context = context
+        self.endpoint = endpoint
+        self.known_instruments = known_instruments
+        self.instruments = dict()
+        self.threads = dict()
+
+    def serve(self):
+        socket = self.context.socket(zmq.REP)
+        socket.bind(self.endpoint)
+        logging.info("Agent listening on " + self.endpoint)
+        try:
+            while True:
+                message = socket.recv()
+                receive_time = time.time_ns()
+                # A bad request is answered with an error, so that the agent keeps serving
+                try:
+                    reply = self.process_request(json.loads(message))
+                except KeyError as e:
+                    reply = {"error": "Missing field in request: " + str(e)}
+                except (ValueError, TypeError) as e:
+                    reply = {"error": "Invalid request: " + str(e)}
+                if "error" in reply:
+                    logging.error(reply["error"])
+                reply["receive_time"] = receive_time
+                reply["send_time"] = time.time_ns()
+                socket.send_json(reply)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket.close()
+
+    def process_request(self, message):
+        if message["command"] == "ping":
+            return dict()
+        elif message["command"] == "deploy":
+            return self.deploy(message)
+        elif message["command"] == "join":
+            name = message["name"]
+            self.threads.pop(name).join()
+            instrument = self.instruments.pop(name)
+            logging.info("Instrument " + name + " ended")
+            return {"cpu_time_ns": getattr(instrument, "cpu_time_ns", 0)}
+        else:
+            raise ValueError("Unknown command: " + message["command"])
+
+    def deploy(self, message):
+        name = message["name"]
+        if message["kind"] not in self.known_instruments:
+            raise ValueError("Unknown instrument: " + message["kind"])
+        if name in self.instruments:
+            raise ValueError("Instrument already deployed: " + name)
+        instrument = self.known_instruments[message["kind"]](
+            name, self.context, message["configuration"]
+        )
+        instrument.codec = create_codec(message["codec"])
+        if hasattr(instrument, "clock_offset"):
+            # Instruments that write their own output align it with the clock of the director
+            instrument.clock_offset = datetime.timedelta(
+                microseconds=message["offset_ns"] / 1000
+            )
+        # Bound here to a free port, to which the director connects
+        instrument.endpoint = "tcp://*:0"
+        instrument.init_sockets()
+        thread = Thread(target=instrument.main)
+        thread.start()
+        self.instruments[name] = instrument
+        self.threads[name] = thread
+        logging.info("Instrument " + name + " deployed on " + instrument.endpoint)
+        return {"port": int(instrument.endpoint.rsplit(":", 1)[1])}
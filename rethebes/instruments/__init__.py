@@ -1,4 +1,6 @@
 from .loader import *
 from .manager import *
+from .replay import *
 from .sensor import *
 from .timer import *
+from .watchdog import *
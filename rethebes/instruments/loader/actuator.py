@@ -9,9 +9,13 @@ License: See package-level license file.
 
 import time
 
+from .kernels import ScalarKernel
+
 
 class Actuator:
-    def __init__(self, controller, monitor, duration, target, actuation_period):
+    def __init__(
+        self, controller, monitor, duration, target, actuation_period, kernel=None
+    ):
         self.controller = controller
         self.monitor = monitor
         self.duration = duration
@@ -20,6 +24,8 @@ class Actuator:
         # The actuation period (in seconds) should not be bigger than the controller reference period
         # However they need not be the same, and originally this was set at 0.05, while reference was 0.1
         self.actuation_period = actuation_period
+        self.kernel = kernel if kernel is not None else ScalarKernel()
+        self.runs = 0  # Chunks of work done by the kernel, for its throughput
         self.start_time = time.time()
 
     def close(self):
@@ -27,31 +33,22 @@ class Actuator:
 
     def generate_load(self, sleep_time):
         interval = time.time() + self.actuation_period - sleep_time
-        dummy = 213123
         # generates some load for interval seconds
+        runs = 0
         while time.time() < interval:
-            dummy = self.compute(dummy)
+            self.kernel.run()
+            runs += 1
+        self.runs += runs
         time.sleep(sleep_time)
 
-    def compute(self, dummy):
-        _ = dummy * dummy
-        return dummy + 1
-
     def run(self):
         while self.duration < 0 or (time.time() - self.start_time) <= self.duration:
-            self.controller.set_cpu_load(self.monitor.get_cpu_load())
-            sleep_time = self.controller.get_sleep_time()
-            self.generate_load(sleep_time)
+            sleep_time = self.step()
         return sleep_time
 
-    def run_sequence(self, sequence):
-        # Currently unused
-        for cpu_target in sequence:
-            step_period = time.time() + 4
-            self.controller.set_cpu_target(cpu_target)
-            self.monitor.set_cpu_target(cpu_target)
-            while time.time() < step_period:
-                self.controller.set_cpu_load(self.monitor.get_cpu_load())
-                sleep_time = self.controller.get_sleep_time()
-                self.generate_load(sleep_time)
-                self.monitor.set_sleep_time(sleep_time)
+    def step(self):
+        # One actuation period
+        self.controller.set_cpu_load(self.monitor.get_cpu_load())
+        sleep_time = self.controller.get_sleep_time()
+        self.generate_load(sleep_time)
+        return sleep_time
@@ -99,3 +99,69 @@ class ControllerThread(Thread):
                 self.int_err = self.int_err - self.err * samp_int
 
             self.set_sleep_time(calculate_output_sleep_time(self.cpu_period))
+
+
+class InlineController:
+    # Same interface as ControllerThread, but updated synchronously by the actuator at every actuation period
+    # The output is the busy fraction of the actuation period, i.e. the target plus a PI correction
+    def __init__(self, actuation_period=0.05, ki=1.0, kp=0.2):
+        self.actuation_period = actuation_period
+        self.ki = ki
+        self.kp = kp
+        self.cpu_target = 0
+        self.int_err = 0
+        self.last_ts = time.perf_counter()
+        self.sleep_time = actuation_period
+
+    def get_sleep_time(self):
+        return self.sleep_time
+
+    def get_cpu_target(self):
+        return self.cpu_target
+
+    def set_cpu_target(self, cpu_target):
+        self.cpu_target = cpu_target
+
+    def set_cpu_load(self, cpu_load):
+        # cpu_load is the busy fraction measured since the previous call
+        # After an idle time, the integral must not jump
+        ts = time.perf_counter()
+        interval = min(ts - self.last_ts, 2 * self.actuation_period)
+        self.last_ts = ts
+        err = self.cpu_target - cpu_load
+        self.int_err += self.ki * err * interval
+        busy = self.cpu_target + self.kp * err + self.int_err
+        # anti wind up control
+        if busy < 0 or busy > 1:
+            self.int_err -= self.ki * err * interval
+            busy = min(max(busy, 0), 1)
+        self.sleep_time = (1 - busy) * self.actuation_period
+
+
+class TemperatureController:
+    # Outer loop of the loader, with the same PI structure, whose output is the load that holds a temperature
+    # Updated by the loader with every sample of the sensor, rather than periodically
+    def __init__(self, temperature_target, load=0, ki=0.002, kp=0.02):
+        self.temperature_target = temperature_target  # °C
+        self.ki = ki  # 1/(K s)
+        self.kp = kp  # 1/K
+        self.int_err = load  # The loop starts from the initial load without jumps
+        self.last_ts = None
+        self.load = load  # Fraction of the target cores
+
+    def set_temperature(self, ts, temperature):
+        # ts is the time of the sample, which may arrive late or out of order
+        if self.last_ts is not None and ts <= self.last_ts:
+            return self.load
+        # Note that if the temperature is too high, the error is negative, and so is the correction
+        err = self.temperature_target - temperature
+        samp_int = ts - self.last_ts if self.last_ts is not None else 0
+        self.last_ts = ts
+        self.int_err += self.ki * err * samp_int
+        load = self.kp * err + self.int_err
+        # anti wind up control
+        if load < 0 or load > 1:
+            self.int_err -= self.ki * err * samp_int
+            load = min(max(load, 0), 1)
+        self.load = load
+        return load
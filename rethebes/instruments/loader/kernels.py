@@ -0,0 +1,78 @@
+"""
+Part of the module that loads CPU cores, these classes are the workloads that the actuator runs while the CPU is busy.
+Each call of run does a small chunk of work (well below 1 ms), so that the duty cycle is controlled finely.
+The kernels stress different parts of the core, and so generate different heat at the same load.
+
+Authors: Giulio Foletto.
+License: See package-level license file.
+"""
+
+import numpy as np
+
+known_kernels = ["scalar", "fp_matmul", "memory_copy", "pointer_chase"]
+
+
+def create_kernel(name):
+    if name == "scalar":
+        return ScalarKernel()
+    elif name == "fp_matmul":
+        return MatmulKernel()
+    elif name == "memory_copy":
+        return CopyKernel()
+    elif name == "pointer_chase":
+        return PointerChaseKernel()
+    else:
+        raise ValueError("Unknown kernel: " + name)
+
+
+class ScalarKernel:
+    # Integer arithmetic in the interpreter, mostly exercises its dispatch loop
+    def __init__(self):
+        self.dummy = 213123
+
+    def run(self):
+        _ = self.dummy * self.dummy
+        self.dummy += 1
+
+
+class MatmulKernel:
+    # Floating point (SIMD) multiplication of blocks that fit in L1/L2 cache
+    def __init__(self, size=64):
+        rng = np.random.default_rng(0)
+        self.a = rng.random((size, size))
+        self.b = rng.random((size, size))
+        self.c = np.empty((size, size))
+
+    def run(self):
+        np.matmul(self.a, self.b, out=self.c)
+
+
+class CopyKernel:
+    # Streaming copy of a buffer much larger than the cache, which loads the memory bus
+    def __init__(self, size=16 * 2**20, chunk=2**20):
+        self.source = np.ones(size // 8)
+        self.destination = np.empty_like(self.source)
+        self.chunk = chunk // 8
+        self.position = 0
+
+    def run(self):
+        end = self.position + self.chunk
+        np.copyto(
+            self.destination[self.position : end], self.source[self.position : end]
+        )
+        self.position = end % len(self.source)
+
+
+class PointerChaseKernel:
+    # Dependent random reads in a buffer much larger than the cache, which miss the cache and the TLB
+    # Several chains are followed at once, otherwise the interpreter would dominate
+    def __init__(self, size=16 * 2**20, chains=8192):
+        rng = np.random.default_rng(0)
+        # A single cycle through all the entries, so that chains never get stuck in a short loop
+        order = rng.permutation(size // 8)
+        self.next = np.empty_like(order)
+        self.next[order] = np.roll(order, -1)
+        self.positions = order[:chains].copy()
+
+    def run(self):
+        np.take(self.next, self.positions, out=self.positions)
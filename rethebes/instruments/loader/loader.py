@@ -7,116 +7,470 @@ Authors: Gaetano Carlucci, Giuseppe Cofano, Giulio Foletto.
 License: See package-level license file.
 """
 
-import itertools
+import datetime
 import json
 import logging
+import math
 import multiprocessing
 import os
+import time
 
 import psutil
 
 from rethebes.instrulib import Instrument
+from rethebes.profiles import create_profile
+from rethebes.topology import (
+    available_cpus,
+    discover_topology,
+    restrict_topology,
+    select_cores,
+)
 from rethebes.util import configure_logging
 
 from .actuator import Actuator
-from .controller import ControllerThread
-from .monitor import MonitorThread
+from .controller import ControllerThread, InlineController, TemperatureController
+from .kernels import create_kernel, known_kernels
+from .monitor import InlineMonitor, MonitorThread
+from .steady import SteadyStateDetector
 
 
 class Loader(Instrument):
     def __init__(self, name, context, configuration):
         self.configuration = configuration
+        self.steps = iter(self.configuration)
+        self.load = None
+        self.end_time = 0
+        self.step_number = 0  # From 1, 0 before the first step
+        # Step number, average achieved load and RMS error of steps with load
+        self.tracking = []
+        self.detector = None
+        self.settling_time = None
+        # Step number and settling time of steps that ended at steady state
+        self.settling_times = []
+        self.temperature_controller = None
+        self.target_cpus = []
+        self.commanded_load = None
+        # Time of the sample that caused a critical event, and the time it took to stop the load after it
+        self.critical_sample_time = None
+        self.stop_latency = None
+        # Seconds between publications of the telemetry of the workers, None to not publish it
+        self.telemetry_interval = None
         super().__init__(name, context)
+        # Steps that end at steady state or hold a temperature follow the temperature measured by the sensor,
+        # which it publishes on the data plane, without passing through the director
+        if any(
+            load["until"] == "steady" or load["target_temperature"] is not None
+            for load in self.configuration
+        ):
+            self.data_subscription = {"headers": ["sensor-data"]}
 
     def open(self):
-        self.physical_cores = psutil.cpu_count(logical=False)
-        self.logical_cores = psutil.cpu_count(logical=True)
-        self.hyperthreading = self.logical_cores // self.physical_cores
+        topology = discover_topology()
+        cpus = available_cpus(topology)
+        self.topology = restrict_topology(topology, cpus)
+        # One worker per available logical CPU lives for the whole run, and gets new targets at every step
+        # Forking a process with several threads might deadlock, so always spawn
+        context = multiprocessing.get_context("spawn")
+        self.connections = dict()
+        self.workers = []
+        # Shared by all workers, which check it at every actuation period
+        self.stop_event = context.Event()
+        # Cumulative CPU time, sleep time, actuation periods and kernel runs of each worker,
+        # written by the worker at every actuation period, and read by the loader without messages
+        self.counters = dict()
+        self.thread_names = dict()
+        for core in topology:
+            for i, cpu in enumerate(core.cpus):
+                if cpu not in cpus:
+                    continue
+                connection, child_connection = context.Pipe()
+                self.counters[cpu] = context.RawArray("d", 4)
+                self.thread_names[cpu] = (
+                    "CPU Core #" + str(core.number) + " Thread #" + str(i + 1)
+                )
+                worker = context.Process(
+                    target=work,
+                    args=(cpu, child_connection, self.stop_event, self.counters[cpu]),
+                )
+                worker.start()
+                self.connections[cpu] = connection
+                self.workers.append(worker)
+        for worker, (cpu, connection) in zip(self.workers, self.connections.items()):
+            reply = self.receive_from_worker(worker, connection)
+            if reply != "ready":
+                self.process_internal_error(
+                    "Loading worker of CPU " + str(cpu) + " failed to start: " + reply
+                )
+                return
+
+    def receive_from_worker(self, worker, connection):
+        # Like recv, but a description of the failure if the worker ends without sending
+        try:
+            while not connection.poll(0.1):
+                if not worker.is_alive():
+                    return "worker ended"
+            return connection.recv()
+        except (EOFError, OSError):
+            return "worker ended"
+
+    def close(self):
+        # Loading workers stop at once, then all of them end when they read their pipe
+        # Workers may have already ended, e.g. on CTRL+C, and their pipes are broken
+        self.stop_event.set()
+        for connection in self.connections.values():
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+        for connection in self.connections.values():
+            try:
+                if connection.poll(1):
+                    connection.recv()  # The worker stopped loading
+            except (EOFError, OSError):
+                pass
+        if self.critical_sample_time is not None:
+            self.stop_latency = time.time() - self.critical_sample_time
+            logging.warning(
+                "Load stopped "
+                + format(1000 * self.stop_latency, ".1f")
+                + " ms after the sample that caused the critical event"
+            )
+        for worker in self.workers:
+            worker.join()
+        for connection in self.connections.values():
+            connection.close()
+
+    def process_message(self, message):
+        body = message["body"]
+        if body.get("command") == "close" and "critical" in body:
+            self.critical_sample_time = body["critical"].get("sample_time")
+        super().process_message(message)
+
+    def get_timeout(self):
+        timeout = None  # infinite step
+        if self.end_time is not None:
+            timeout = max(0, self.end_time - time.time())
+        if self.telemetry_interval is not None:
+            telemetry_timeout = max(0, self.next_telemetry - time.time())
+            if timeout is None or telemetry_timeout < timeout:
+                timeout = telemetry_timeout
+        return timeout
 
     def run(self):
-        for load in self.configuration:
-            # This is a long running operation, so we need to check state often
-            self.listen(0)
-            if self.get_state() != "running":
-                break
-            # Preprocess load at interface level
-            # Allow loading all cores with "all"
-            if load["target_cores"] == "all":
-                load["target_cores"] = []
-                for i in range(self.physical_cores):
-                    load["target_cores"].append(i + 1)
-            # Allow setting one core without writing it as a list
-            if isinstance(load["target_cores"], int):
-                load["target_cores"] = [load["target_cores"]]
-            # Allow setting one load for the selected cores
-            if not isinstance(load["target_loads"], list):
-                value = load["target_loads"]
-                load["target_loads"] = []
-                for i in range(len(load["target_cores"])):
-                    load["target_loads"].append(value)
-            logging.info("Starting load: " + json.dumps(load))
-            self.send_event(command="start", **load)
-
-            # Preprocess load at working level
-            target_cores = []
-            target_loads = []
-            duration = load["duration"]
-            sampling_interval = load["sampling_interval"]
-
-            # Internally, cores are grouped as two due to hyperthreading
-            # At interface level, we want to start from 1 and get to number of cores
-            # We load a process for each of the two logical threads of each core
+        now = time.time()
+        if self.telemetry_interval is not None and now >= self.next_telemetry:
+            self.send_telemetry(now)
+        if self.end_time is not None and now >= self.end_time:
+            self.next_step()
+
+    def send_telemetry(self, now):
+        # Rates over the interval since the previous publication, from differences of the counters
+        interval = now - self.last_telemetry
+        data = {"Time": datetime.datetime.fromtimestamp(now).isoformat()}
+        for cpu, counters in self.counters.items():
+            values = counters[:]
+            cpu_time, sleep_time, periods, runs = [
+                v - p for v, p in zip(values, self.last_counters[cpu])
+            ]
+            self.last_counters[cpu] = values
+            name = self.thread_names[cpu]
+            data["Worker Load " + name] = 100 * cpu_time / interval
+            data["Worker Sleep " + name] = (
+                1000 * sleep_time / periods if periods > 0 else None
+            )
+            data["Worker Throughput " + name] = runs / interval
+        self.send_data("loader-data", data)
+        self.last_telemetry = now
+        # Publications do not drift, but skip those that are already late
+        self.next_telemetry = max(self.next_telemetry + self.telemetry_interval, now)
+
+    def process_data_message(self, message):
+        if self.state != "running" or self.load is None:
+            return
+        temperature = message["body"].get(self.load["temperature_sensor"])
+        if temperature is None:
+            return
+        t = datetime.datetime.fromisoformat(message["body"]["Time"]).timestamp()
+        if self.temperature_controller is not None:
+            self.control_temperature(t, temperature)
+        if self.detector is not None:
+            self.detect_steady_state(t, temperature)
+
+    def control_temperature(self, t, temperature):
+        load = self.temperature_controller.set_temperature(t, temperature)
+        # Workers get the new target right away, without replying
+        for cpu in self.target_cpus:
+            self.connections[cpu].send(load)
+        # The sensor records the command, but only changes of at least 0.5% are worth an event
+        if abs(load - self.commanded_load) >= 0.005:
+            self.commanded_load = load
+            self.send_event(
+                command="target",
+                target_cores=self.load["target_cores"],
+                target_loads=[100 * load] * len(self.load["target_cores"]),
+            )
+
+    def detect_steady_state(self, t, temperature):
+        previous = self.detector.get_settling_time()
+        steady = self.detector.update(t, temperature)
+        if self.detector.get_settling_time() != previous:
+            # The temperature became steady or stopped being steady, this is recorded by the sensor
+            self.send_event(
+                command="steady", settling_time=self.detector.get_settling_time()
+            )
+        if steady:
+            self.settling_time = self.detector.get_settling_time()
+            self.settling_times.append((self.step_number, self.settling_time))
+            logging.info(
+                "Step "
+                + str(self.step_number)
+                + " settled after "
+                + format(self.settling_time, ".1f")
+                + " s, deviation from trend "
+                + format(self.detector.regression.get_deviation(), ".2f")
+                + " K"
+            )
+            # End the step now, next_step is called right after this
+            self.detector = None
+            self.end_time = time.time()
+
+    def next_step(self):
+        # Called at the end of each step, steps follow each other without gaps
+        if self.load is not None:
+            self.send_event(
+                command="stop", settling_time=self.settling_time, **self.load
+            )
+            self.detector = None
+            self.settling_time = None
+            self.temperature_controller = None
+        self.load = next(self.steps, None)
+        if self.load is None:
+            self.set_targets([], [], None)
+            self.telemetry_interval = None
+            # Single runner, go to waiting to be safe and avoid spurious run
+            self.set_state("waiting")
+            self.send_event(command="finish")
+            return
+        load = self.load
+        # Preprocess load at interface level
+        # Allow loading all cores with "all", one core without writing it as a list,
+        # or the cores of some packages, NUMA nodes or types with a dict
+        try:
+            load["target_cores"] = select_cores(self.topology, load["target_cores"])
+        except (AttributeError, ValueError) as e:
+            self.process_internal_error("Invalid core selection: " + repr(e))
+            self.set_state("waiting")
+            return
+        cores = {core.number: core for core in self.topology}
+        for core in load["target_cores"]:
+            if core not in cores:
+                self.process_internal_error("Unknown core: " + repr(core))
+                self.set_state("waiting")
+                return
+        # Allow setting one load for the selected cores
+        if not isinstance(load["target_loads"], list):
+            value = load["target_loads"]
+            load["target_loads"] = []
             for i in range(len(load["target_cores"])):
-                for j in range(self.hyperthreading):
-                    target_cores.append(2 * (load["target_cores"][i] - 1) + j)
-
-            for i in range(len(load["target_loads"])):
-                # We attribute the requested load to each of the two logical threads
-                # Recent LHM reports load per thread, so this is consistent
-                for j in range(self.hyperthreading):
-                    target_loads.append(load["target_loads"][i] * 1 / 100)
-
-            with multiprocessing.Pool(len(target_cores)) as pool:
-                pool.starmap(
-                    load_core,
-                    zip(
-                        target_cores,
-                        target_loads,
-                        itertools.repeat(duration),
-                        itertools.repeat(sampling_interval),
-                    ),
-                )
-            self.send_event(command="stop", **load)
-        # Single runner, go to waiting to be safe and avoid spurious run
-        self.set_state("waiting")
-        self.send_event(command="finish")
+                load["target_loads"].append(value)
+        if load["kernel"] not in known_kernels:
+            self.process_internal_error("Unknown kernel: " + load["kernel"])
+            self.set_state("waiting")
+            return
+        if load["measurement"] not in ["inline", "monitor"]:
+            self.process_internal_error("Unknown measurement: " + load["measurement"])
+            self.set_state("waiting")
+            return
+        if load["until"] not in ["duration", "steady"]:
+            self.process_internal_error("Unknown end of step: " + load["until"])
+            self.set_state("waiting")
+            return
+        try:
+            profile = create_profile(load["profile"], load["duration"])
+        except (KeyError, TypeError, ValueError, OSError) as e:
+            self.process_internal_error("Invalid profile: " + repr(e))
+            self.set_state("waiting")
+            return
+        if profile is not None and load["target_temperature"] is not None:
+            self.process_internal_error(
+                "A load cannot have both a profile and a target temperature"
+            )
+            self.set_state("waiting")
+            return
+        # Steps are scheduled back to back, so that lateness does not accumulate
+        start_time = self.end_time or time.time()
+        logging.info("Starting load: " + json.dumps(load))
+        # The start time allows to evaluate the profile elsewhere, e.g. to record the command
+        self.send_event(command="start", start_time=start_time, **load)
 
+        # Preprocess load at working level
+        # At interface level, cores start from 1, and only those available to the process are loaded
+        # We attribute the requested load to each of the logical threads of each core
+        # Recent LHM reports load per thread, so this is consistent
+        target_cpus = []
+        target_loads = []
+        for core, target_load in zip(load["target_cores"], load["target_loads"]):
+            for cpu in cores[core].cpus:
+                target_cpus.append(cpu)
+                target_loads.append(target_load * 1 / 100)
 
-def load_core(target_core, target_load, duration=-1, sampling_interval=0.1):
-    # Reconfigure this as logging lives per process
-    configure_logging()
+        settings = {
+            "sampling_interval": load["sampling_interval"],
+            "kernel": load["kernel"],
+            "measurement": load["measurement"],
+            "profile": profile,
+            "start_time": start_time,
+        }
+        self.set_targets(target_cpus, target_loads, settings)
+        self.step_number += 1
+        self.target_cpus = target_cpus
+        if self.telemetry_interval is None and load["telemetry_interval"] is not None:
+            self.last_telemetry = start_time
+            self.last_counters = {cpu: c[:] for cpu, c in self.counters.items()}
+            self.next_telemetry = start_time + load["telemetry_interval"]
+        self.telemetry_interval = load["telemetry_interval"]
+        if load["target_temperature"] is not None:
+            # The target loads are the initial ones, then the loads follow the temperature
+            initial = sum(target_loads) / len(target_loads) if target_loads else 0
+            self.temperature_controller = TemperatureController(
+                load["target_temperature"],
+                initial,
+                load["temperature_ki"],
+                load["temperature_kp"],
+            )
+            self.commanded_load = initial
+        # With steady state detection, the duration is the maximum one
+        self.end_time = start_time + load["duration"] if load["duration"] >= 0 else None
+        if load["until"] == "steady":
+            self.detector = SteadyStateDetector(
+                start_time,
+                load["steady_window"],
+                load["steady_slope"],
+                load["steady_hold"],
+                load["min_duration"],
+            )
+
+    def set_targets(self, target_cpus, target_loads, settings):
+        # Logical CPUs that are not targeted go idle, and get no settings
+        targets = dict(zip(target_cpus, target_loads))
+        for cpu, connection in self.connections.items():
+            if cpu in targets:
+                connection.send((targets[cpu], settings))
+            else:
+                connection.send((0, None))
+        # Workers reply with the tracking of the step that ended
+        count, total, squares = 0, 0, 0
+        for connection in self.connections.values():
+            c, t, s = connection.recv()
+            count, total, squares = count + c, total + t, squares + s
+        if count > 0:
+            achieved = total / count
+            error = math.sqrt(squares / count)
+            self.tracking.append((self.step_number, achieved, error))
+            logging.info(
+                "Load tracking of step "
+                + str(self.step_number)
+                + ": achieved "
+                + format(100 * achieved, ".1f")
+                + "% on average, RMS error "
+                + format(100 * error, ".1f")
+                + "%"
+            )
 
-    # lock this process to the target core
-    process = psutil.Process(os.getpid())
-    process.cpu_affinity([target_core])
 
-    monitor = MonitorThread(target_core, sampling_interval)
-    control = ControllerThread(sampling_interval, 0.1)
-    control.set_cpu_target(target_load)
+def work(target_core, connection, stop_event, counters):
+    # Reconfigure this as logging lives per process
+    configure_logging()
 
-    actuator = Actuator(control, monitor, duration, target_core, 0.05)
+    # Inline measurement needs no threads, those of the monitor are started only if requested
+    inline = (InlineController(0.05), InlineMonitor())
+    threads = None
+    actuator = Actuator(*inline, -1, target_core, 0.05)
+    kernels = dict()
 
     try:
-        monitor.start()
-        control.start()
-        actuator.run()
+        # lock this process to the target core
+        try:
+            psutil.Process(os.getpid()).cpu_affinity([target_core])
+        except (ValueError, psutil.Error) as e:
+            # The failure is reported to the loader instead of ready
+            connection.send(repr(e))
+            return
+        counters[0] = time.thread_time()  # Excluding the time to start
+        connection.send("ready")
+        target = 0
+        profile = None
+        active = False
+        # Load achieved in each actuation period, for the tracking error of the step
+        count, total, squares = 0, 0, 0
+        while True:
+            if active and stop_event.is_set():
+                # The loader is closing, the pipe tells when to end
+                active = False
+            # Idle workers block until the next target
+            if connection.poll(0 if active else None):
+                command = connection.recv()
+                if command is None:
+                    connection.send("stopped")
+                    break
+                if not isinstance(command, tuple):
+                    # New target within the same step, from the temperature control of the loader
+                    target = command
+                    active = target > 0
+                    continue
+                connection.send((count, total, squares))
+                count, total, squares = 0, 0, 0
+                target, settings = command
+                profile = None
+                if settings is not None:
+                    # The profile, if any, replaces the constant target
+                    profile = settings["profile"]
+                    start_time = settings["start_time"]
+                    if settings["measurement"] == "monitor":
+                        if threads is None:
+                            threads = (
+                                ControllerThread(0.1, 0.1),
+                                MonitorThread(target_core, 0.1),
+                            )
+                            for thread in threads:
+                                thread.start()
+                        for thread in threads:
+                            thread.sampling_interval = settings["sampling_interval"]
+                        actuator.controller, actuator.monitor = threads
+                    else:
+                        actuator.controller, actuator.monitor = inline
+                    # Kernels allocate their buffers once per worker
+                    kernel = settings["kernel"]
+                    if kernel not in kernels:
+                        kernels[kernel] = create_kernel(kernel)
+                    actuator.kernel = kernels[kernel]
+                active = target > 0 or profile is not None
+            if active:
+                if profile is not None:
+                    target = profile.value(time.time() - start_time) / 100
+                # Applied in place, so the controller keeps its state across steps
+                actuator.controller.set_cpu_target(target)
+                start = time.perf_counter()
+                start_cpu = time.thread_time()
+                sleep_time = actuator.step()
+                end_cpu = time.thread_time()
+                achieved = (end_cpu - start_cpu) / (time.perf_counter() - start)
+                count += 1
+                total += achieved
+                squares += (achieved - target) ** 2
+                # Telemetry, whose differences the loader reads at its own pace
+                counters[0] = end_cpu
+                counters[1] += sleep_time
+                counters[2] += 1
+                counters[3] = actuator.runs
     except KeyboardInterrupt:
         logging.warning("Subprocess terminated due to CTRL+C event")
     except:
         logging.warning("Subprocess terminated due to exception")
     finally:
         actuator.close()
-        monitor.stop()
-        control.stop()
-        monitor.join()
-        control.join()
+        if threads is not None:
+            for thread in threads:
+                thread.stop()
+            for thread in threads:
+                thread.join()
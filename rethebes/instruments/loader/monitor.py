@@ -18,7 +18,6 @@ class MonitorThread(Thread):
     def __init__(self, cpu_core, interval):
         # Synchronization variables
         self.shutdown_flag = Event()
-        self.sleep_lock = RLock()
         self.cpu_lock = RLock()
 
         self.cpu_core = cpu_core  # unused currently
@@ -26,11 +25,6 @@ class MonitorThread(Thread):
         self.sample = 0.5  # cpu load measurement sample (with useless initial value)
         self.cpu_load = 0.5  # cpu load filtered (with useless initial value)
         self.alpha = 1  # filter coefficient
-        self.sleep_time = 0.03  # useful only for Actuator.run_sequence, which is unused
-        self.sleep_time_target = (
-            0.03  # useful only for Actuator.run_sequence, which is unused
-        )
-        self.cpu_target = 0.5  # useful only for Actuator.run_sequence, which is unused
 
         super(MonitorThread, self).__init__()
 
@@ -46,16 +40,6 @@ class MonitorThread(Thread):
             # Apply first order filter to the measurement samples
             self.cpu_load = self.alpha * cpu_load + (1 - self.alpha) * self.cpu_load
 
-    def set_sleep_time_target(self, sleep_time_target):
-        self.sleep_time_target = sleep_time_target
-
-    def set_sleep_time(self, sleep_time):
-        with self.sleep_lock:
-            self.sleep_time = sleep_time
-
-    def set_cpu_target(self, cpu_target):
-        self.cpu_target = cpu_target
-
     def run(self):
         p = psutil.Process(os.getpid())
         self.shutdown_flag.clear()
@@ -64,3 +48,21 @@ class MonitorThread(Thread):
             # in the interval of length self.sampling_interval (blocking)
             self.sample = p.cpu_percent(self.sampling_interval) * 1 / 100
             self.set_cpu_load(self.sample)
+
+
+class InlineMonitor:
+    # Same interface as MonitorThread, but measures the busy fraction of the actuator
+    # from the CPU time of its thread since the previous call, i.e. over the last actuation period
+    def __init__(self):
+        self.last_time = time.perf_counter()
+        self.last_cpu_time = time.thread_time()
+        self.cpu_load = 0
+
+    def get_cpu_load(self):
+        now = time.perf_counter()
+        cpu_time = time.thread_time()
+        if now > self.last_time:
+            self.cpu_load = (cpu_time - self.last_cpu_time) / (now - self.last_time)
+        self.last_time = now
+        self.last_cpu_time = cpu_time
+        return self.cpu_load
@@ -0,0 +1,90 @@
+"""
+Part of the module that loads CPU cores, these classes detect when a temperature reaches steady state during a step,
+so that the loader can end the step early instead of waiting for its full duration.
+The slope of the temperature is fitted by least squares over a rolling window of samples,
+whose sums are updated incrementally, so that each sample costs the same regardless of the window.
+
+Authors: Giulio Foletto.
+License: See package-level license file.
+"""
+
+import collections
+import math
+
+
+class RollingRegression:
+    def __init__(self, window):
+        self.window = window  # s
+        self.samples = collections.deque()
+        self.n = 0
+        self.sum_t = 0
+        self.sum_y = 0
+        self.sum_tt = 0
+        self.sum_ty = 0
+        self.sum_yy = 0
+
+    def add(self, t, y):
+        # Times should be relative to a recent origin, otherwise their squares lose precision
+        self.samples.append((t, y))
+        self.update(t, y, 1)
+        while t - self.samples[0][0] > self.window:
+            self.update(*self.samples.popleft(), -1)
+
+    def update(self, t, y, sign):
+        self.n += sign
+        self.sum_t += sign * t
+        self.sum_y += sign * y
+        self.sum_tt += sign * t * t
+        self.sum_ty += sign * t * y
+        self.sum_yy += sign * y * y
+
+    def get_slope(self):
+        # None until two samples at different times are available
+        variance_t = self.n * self.sum_tt - self.sum_t**2
+        if self.n < 2 or variance_t <= 0:
+            return None
+        return (self.n * self.sum_ty - self.sum_t * self.sum_y) / variance_t
+
+    def get_deviation(self):
+        # Standard deviation of the samples from the fitted line
+        slope = self.get_slope()
+        if slope is None:
+            return None
+        variance_y = self.sum_yy / self.n - (self.sum_y / self.n) ** 2
+        variance_t = self.sum_tt / self.n - (self.sum_t / self.n) ** 2
+        return math.sqrt(max(0, variance_y - slope**2 * variance_t))
+
+
+class SteadyStateDetector:
+    def __init__(self, start_time, window, slope, hold, min_duration):
+        self.start_time = start_time  # Of the step, like time.time()
+        self.window = window  # s, over which the slope is fitted
+        self.slope = slope  # K/s, below which the temperature is steady
+        self.hold = hold  # s, for which the slope must stay below threshold
+        self.min_duration = min_duration  # s, before which the step never ends
+        self.regression = RollingRegression(window)
+        self.first_time = None
+        self.steady_since = None
+
+    def update(self, t, temperature):
+        # Returns True when the step can end, t is the time of the sample like time.time()
+        t = t - self.start_time
+        if t < 0:  # Sampled during the previous step
+            return False
+        self.regression.add(t, temperature)
+        if self.first_time is None:
+            self.first_time = t
+        slope = self.regression.get_slope()
+        # The slope is meaningful only once the window is full
+        if t - self.first_time < self.window or slope is None:
+            return False
+        if abs(slope) > self.slope:
+            self.steady_since = None
+            return False
+        if self.steady_since is None:
+            self.steady_since = t
+        return t - self.steady_since >= self.hold and t >= self.min_duration
+
+    def get_settling_time(self):
+        # Seconds from the start of the step since when the slope has stayed below threshold
+        return self.steady_since
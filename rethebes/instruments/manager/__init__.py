@@ -1 +1 @@
-from .manager import Manager
+from .manager import AsyncManager, Manager
@@ -5,13 +5,13 @@ Authors: Giulio Foletto.
 License: See project-level license file.
 """
 
-from rethebes.instrulib import Director
+from rethebes.instrulib import AsyncDirector, Director
 
 
 class Manager(Director):
-    def __init__(self, name, context, subordinates, master):
+    def __init__(self, name, context, subordinates, master, codec="json"):
         self.master = master
-        super().__init__(name, context, subordinates)
+        super().__init__(name, context, subordinates, codec)
 
     def process_message(self, message):
         if "-event" in message["header"] and message["body"]["command"] == "finish":
@@ -20,3 +20,8 @@ class Manager(Director):
                 self.wait_for_closure()
         else:
             super().process_message(message)
+
+
+class AsyncManager(Manager, AsyncDirector):
+    # Runs asynchronous instruments as tasks of its event loop, and the others in threads
+    pass
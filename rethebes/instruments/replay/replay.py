@@ -0,0 +1,70 @@
+"""
+Class that implements an instrument that replays a recorded output file as sensor data.
+The original timing is scaled by a speed factor, or discarded to replay as fast as possible.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import logging
+import math
+import time
+
+import numpy as np
+
+from rethebes.instrulib import Instrument
+from rethebes.util import find_output_file
+
+
+class Replay(Instrument):
+    def __init__(self, name, context, configuration):
+        self.configuration = configuration
+        self.first_run = True
+        super().__init__(name, context)
+
+    def open(self):
+        self.speed = self.configuration["speed"]
+        path = find_output_file(str(self.configuration["file_name"]))
+        if path is None:
+            self.process_internal_error(
+                "File to replay " + str(self.configuration["file_name"]) + " not found"
+            )
+            return
+        # Imported here, because the analysis package also imports the plotting library
+        from rethebes.analysis.util import read_data_from_file
+
+        data = read_data_from_file(path)
+        self.columns = list(data.columns)
+        self.times = data["Time"]
+        # Offsets of samples from the first one, in s
+        self.offsets = (self.times - self.times.iloc[0]).dt.total_seconds().to_numpy()
+        self.values = data[self.columns[1:]].to_numpy(dtype=np.float64)
+        self.index = 0
+
+    def get_timeout(self):
+        if self.first_run or self.speed <= 0 or self.index >= len(self.values):
+            return 0
+        due_ns = self.start_ns + self.offsets[self.index] * 1e9 / self.speed
+        return max(0, due_ns - time.monotonic_ns()) / 1e9
+
+    def run(self):
+        if self.first_run:
+            logging.info(
+                "Replaying "
+                + str(len(self.values))
+                + " samples at speed "
+                + (str(self.speed) if self.speed > 0 else "max")
+            )
+            self.start_ns = time.monotonic_ns()
+            self.first_run = False
+        if self.index >= len(self.values):
+            self.send_event(command="finish")
+            self.set_state("waiting")
+            return
+        self.replay_sample()
+
+    def replay_sample(self):
+        row = [self.times.iloc[self.index].to_pydatetime()]
+        row += [None if math.isnan(v) else v for v in self.values[self.index].tolist()]
+        self.send_data("sensor-data", row, self.columns)
+        self.index += 1
@@ -0,0 +1,124 @@
+"""
+Acquisition of sensors in a dedicated process, which writes rows in a shared memory ring buffer.
+This keeps sampling away from the GIL of the process that orchestrates the instruments.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import logging
+import time
+
+import psutil
+
+from rethebes.instrulib import DeadlineClock
+from rethebes.profiles import LoadCommand, count_cores
+from rethebes.util import configure_logging
+
+from .adaptive import create_adaptive_sampling
+from .cpu import CPU, create_backend
+from .ring import RingBuffer
+from .telemetry import WorkerTelemetry, list_threads
+
+
+def acquire(configuration, connection):
+    # Protocol on connection:
+    # child sends (names, test read, missing temperature hint)
+    # parent sends ("ring", name, capacity) of the ring buffer to start sampling
+    # parent sends ("load", body) of loader events at any time
+    # parent sends ("telemetry", body) of loader data at any time
+    # parent sends None to quit at any time
+    # child sends the report of the clock if it was sampling
+
+    # Reconfigure this as logging lives per process
+    configure_logging()
+    if configuration["acquisition_cpu"] is not None:
+        psutil.Process().cpu_affinity([configuration["acquisition_cpu"]])
+
+    backend = create_backend(configuration)
+    backend.open()
+    try:
+        cpu = CPU(backend, configuration["sensors"])
+        command = create_load_command(configuration, backend)
+        telemetry = create_worker_telemetry(configuration, backend)
+        names = cpu.names + (command.names if command is not None else [])
+        names += telemetry.names if telemetry is not None else []
+        values = cpu.read() + [0.0] * (len(names) - len(cpu.names))
+        connection.send((names, values, backend.missing_temperature_hint))
+        clock = DeadlineClock(
+            configuration["sampling_interval"], configuration["catch_up"]
+        )
+        adaptive = create_adaptive_sampling(configuration, cpu.names)
+        message = connection.recv()
+        while message is not None and message[0] != "ring":
+            process_parent_message(
+                message, backend, clock, adaptive, command, telemetry
+            )
+            message = connection.recv()
+        if message is None:
+            return
+        ring = RingBuffer(len(names) + 1, message[2], message[1])
+        row = [None] * ring.width
+        clock.start()
+        while True:
+            # Waiting on the connection, rather than sleeping, reacts to events at once
+            if connection.poll(clock.get_timeout()):
+                message = connection.recv()
+                if message is None:
+                    break
+                process_parent_message(
+                    message, backend, clock, adaptive, command, telemetry
+                )
+                continue
+            tick = clock.tick()
+            cpu.read(row, 1)
+            offset = 1 + len(cpu.names)
+            if command is not None:
+                command.read(row, offset, time.time())
+                offset += len(command.names)
+            if telemetry is not None:
+                telemetry.read(row, offset)
+            if adaptive is not None:
+                adaptive.update(tick, row, 1)
+                clock.set_interval(adaptive.get_interval(tick))
+            row[0] = clock.to_timestamp(tick)
+            ring.write(row)
+        ring.close()
+        connection.send(clock.report())
+    except KeyboardInterrupt:
+        logging.warning("Sensor process terminated due to CTRL+C event")
+    finally:
+        backend.close()
+
+
+def create_load_command(configuration, backend):
+    # None if the command of the loader is not recorded
+    if not configuration["record_command"]:
+        return None
+    return LoadCommand(count_cores(backend.get_sensors()))
+
+
+def create_worker_telemetry(configuration, backend):
+    # None if the telemetry of the loader is not recorded
+    if not configuration["record_telemetry"]:
+        return None
+    return WorkerTelemetry(list_threads(backend.get_sensors()))
+
+
+def process_parent_message(message, backend, clock, adaptive, command, telemetry):
+    if message[0] == "load":
+        process_load_event(message[1], backend, clock, adaptive, command)
+    elif message[0] == "telemetry":
+        telemetry.process_data(message[1])
+
+
+def process_load_event(body, backend, clock, adaptive, command):
+    # Shared with acquisition in a thread
+    if hasattr(backend, "process_load_event"):
+        backend.process_load_event(body)
+    if command is not None:
+        command.process_load_event(body)
+    if adaptive is not None:
+        now = time.monotonic_ns()
+        adaptive.trigger(now)
+        clock.set_interval(adaptive.get_interval(now))
@@ -0,0 +1,53 @@
+"""
+Adaptive choice of the sampling interval, fast during transients and slow at steady state.
+A transient starts with every event of the loader and with every sample in which a temperature
+changes faster than a threshold, and lasts for a fixed duration after that.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+
+def create_adaptive_sampling(configuration, names):
+    # None if sampling is not adaptive, sampling_interval is the fast interval
+    if not configuration["adaptive_sampling"]:
+        return None
+    return AdaptiveSampling(
+        names,
+        configuration["sampling_interval"],
+        configuration["slow_sampling_interval"],
+        configuration["transient_duration"],
+        configuration["temperature_rate_threshold"],
+    )
+
+
+class AdaptiveSampling:
+    def __init__(self, names, fast_interval, slow_interval, duration, threshold):
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.duration_ns = int(duration * 1e9)
+        self.threshold = threshold  # K/s
+        self.indexes = [
+            i for i, name in enumerate(names) if name.startswith("Temperature")
+        ]
+        self.fast_until_ns = 0
+        self.previous = None
+        self.previous_ns = 0
+
+    def trigger(self, now_ns):
+        self.fast_until_ns = now_ns + self.duration_ns
+
+    def update(self, now_ns, values, offset=0):
+        # To be called with every sample, values are those of all the sensors from values[offset] on
+        temperatures = [values[offset + i] for i in self.indexes]
+        if self.previous is not None and now_ns > self.previous_ns:
+            change = self.threshold * (now_ns - self.previous_ns) / 1e9
+            for t, p in zip(temperatures, self.previous):
+                if t is not None and p is not None and abs(t - p) > change:
+                    self.trigger(now_ns)
+                    break
+        self.previous = temperatures
+        self.previous_ns = now_ns
+
+    def get_interval(self, now_ns):
+        return self.fast_interval if now_ns < self.fast_until_ns else self.slow_interval
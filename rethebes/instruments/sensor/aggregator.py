@@ -0,0 +1,66 @@
+"""
+Streaming aggregation of sensor rows in windows of time, so that sampling can be fast while storage stays small.
+For each window, the mean, min, max and last value of each column are computed incrementally,
+keeping only running statistics of the current window.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import datetime
+import math
+
+import numpy as np
+
+
+class Aggregator:
+    statistics = ["Min", "Max", "Last"]  # The mean keeps the name of the column
+
+    def __init__(self, columns, interval):
+        # columns starts with Time, like rows
+        self.names = columns[1:]
+        self.columns = ["Time"] + self.names
+        for statistic in self.statistics:
+            self.columns += [name + " " + statistic for name in self.names]
+        self.interval = interval
+        self.window = None
+        self.reset()
+
+    def reset(self):
+        size = len(self.names)
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.sums = np.zeros(size)
+        self.mins = np.full(size, np.nan)
+        self.maxs = np.full(size, np.nan)
+        self.lasts = np.full(size, np.nan)
+
+    def add(self, row):
+        # Returns the aggregated row of the previous window when a row of a new window arrives, otherwise None
+        # Windows are aligned to multiples of interval since the epoch
+        window = math.floor(row[0].timestamp() / self.interval)
+        result = None
+        if window != self.window:
+            result = self.finish()
+            self.window = window
+        values = np.array(row[1:], dtype=np.float64)  # None becomes NaN
+        valid = ~np.isnan(values)
+        self.counts += valid
+        self.sums += np.where(valid, values, 0)
+        np.fmin(self.mins, values, out=self.mins)
+        np.fmax(self.maxs, values, out=self.maxs)
+        np.copyto(self.lasts, values, where=valid)
+        return result
+
+    def finish(self):
+        # Returns the aggregated row of the current window, if any, and starts a new one
+        if self.window is None or not self.counts.any():
+            return None
+        with np.errstate(invalid="ignore"):
+            means = self.sums / self.counts
+        # Time is the start of the window
+        row = [datetime.datetime.fromtimestamp(self.window * self.interval)]
+        for values in [means, self.mins, self.maxs, self.lasts]:
+            row += [None if math.isnan(v) else v for v in values.tolist()]
+        self.window = None
+        self.reset()
+        return row
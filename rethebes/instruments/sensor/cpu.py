@@ -1,37 +1,74 @@
 """
-Holder for CPU sensors.
-Note: to find out the correct indexes of the sensor use
-for i in range(50): # arbitrary big number
-    print(i, self.hw.Sensors[i].Name, self.hw.Sensors[i].SensorType)
+Holder for CPU sensors, independent of the backend that actually reads them.
+A backend must provide open(), close(), get_sensors(), subscribe(indexes) and read(values, offset).
+get_sensors() returns a list of (type, name) pairs, which are addressed by their position in the list.
+After subscribe(indexes), read(values, offset) writes the values of the subscribed sensors from values[offset] on.
+Backends that model the load, like the synthetic one, also provide process_load_event(body) for the events of the loader.
 
 Authors: Giulio Foletto.
 License: See project-level license file.
 """
 
+import sys
+from fnmatch import fnmatchcase
+
 
 class CPU:
-    def __init__(self, hw):
-        self.hw = hw
-        self.latest_values = {}
+    def __init__(self, backend, subscriptions="all"):
+        self.backend = backend
+        self.subscriptions = subscriptions
         self.discover_sensors()
 
-    def read(self):
-        self.hw.Update()
-        for key, index in self.sensors.items():
-            self.latest_values[key] = self.hw.Sensors[index].Value
-        return self.latest_values
+    def read(self, values=None, offset=0):
+        # Reading into a preallocated buffer avoids creating objects at every sample
+        if values is None:
+            values = self.values
+        self.backend.read(values, offset)
+        return values
 
     def discover_sensors(self):
-        self.hw.Update()
-        index = 0
-        self.sensors = dict()
-        while True:
-            try:
-                name = str(self.hw.Sensors[index].Name)
-                stype = str(self.hw.Sensors[index].SensorType)
-            except IndexError:
-                break
-            # Accept all sensors
-            # But here is where we could put some rules to discard some
-            self.sensors[stype + " " + name] = index
-            index += 1
+        # Subscriptions are compiled once here to a fixed list of indexes
+        self.names = []
+        indexes = []
+        for index, (stype, name) in enumerate(self.backend.get_sensors()):
+            if is_subscribed(self.subscriptions, stype, name):
+                self.names.append(stype + " " + name)
+                indexes.append(index)
+        self.backend.subscribe(indexes)
+        self.values = [None] * len(self.names)
+
+
+def is_subscribed(subscriptions, stype, name):
+    # Subscriptions are either "all" or a dict like {"Temperature": {"include": ["CPU*"], "exclude": ["*TjMax"]}}
+    # Keys are glob patterns of sensor types, and sensors of types that match no key are discarded
+    if subscriptions == "all":
+        return True
+    subscribed = False
+    for type_pattern, rule in subscriptions.items():
+        if not fnmatchcase(stype, type_pattern):
+            continue
+        if any(fnmatchcase(name, pattern) for pattern in rule.get("exclude", [])):
+            return False
+        if any(fnmatchcase(name, pattern) for pattern in rule.get("include", ["*"])):
+            subscribed = True
+    return subscribed
+
+
+def create_backend(configuration):
+    name = configuration["backend"]
+    if name == "auto":
+        name = "lhm" if sys.platform == "win32" else "linux"
+    if name == "lhm":
+        from .lhm import LHMBackend
+
+        return LHMBackend()
+    elif name == "linux":
+        from .linux import LinuxBackend
+
+        return LinuxBackend()
+    elif name == "synthetic":
+        from .synthetic import SyntheticBackend
+
+        return SyntheticBackend(**configuration["synthetic"])
+    else:
+        raise ValueError("Unknown sensor backend: " + name)
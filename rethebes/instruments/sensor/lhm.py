@@ -0,0 +1,47 @@
+"""
+Sensor backend that uses LibreHardwareMonitor (Windows only).
+Note: to find out the correct indexes of the sensor use
+for i in range(50): # arbitrary big number
+    print(i, self.hw.Sensors[i].Name, self.hw.Sensors[i].SensorType)
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+
+class LHMBackend:
+    missing_temperature_hint = "This is most likely due to rethebes not running with elevated privileges. Please re-execute in an elevated terminal."
+
+    def open(self):
+        from HardwareMonitor import Hardware
+
+        self.pc = Hardware.Computer()
+        self.pc.IsCpuEnabled = True
+        self.pc.Open()
+        self.hw = self.pc.Hardware[0]
+
+    def close(self):
+        self.pc.Close()
+
+    def get_sensors(self):
+        self.hw.Update()
+        index = 0
+        sensors = []
+        while True:
+            try:
+                name = str(self.hw.Sensors[index].Name)
+                stype = str(self.hw.Sensors[index].SensorType)
+            except IndexError:
+                break
+            sensors.append((stype, name))
+            index += 1
+        return sensors
+
+    def subscribe(self, indexes):
+        # Keep references to the sensor objects, to avoid indexing through interop at every read
+        self.subscribed = [self.hw.Sensors[index] for index in indexes]
+
+    def read(self, values, offset=0):
+        self.hw.Update()
+        for i, sensor in enumerate(self.subscribed):
+            values[offset + i] = sensor.Value
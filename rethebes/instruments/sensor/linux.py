@@ -0,0 +1,290 @@
+"""
+Sensor backend for Linux, which reads hwmon, cpufreq and RAPL files in sysfs, and /proc/stat.
+Files are opened once and then read with os.pread, so that sampling at short intervals is cheap.
+Sensors are named like those of LibreHardwareMonitor, so that the data can be analyzed in the same way.
+Sensors that analysis expects but that are not available (e.g. core voltages) are reported with value None.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import os
+import re
+import time
+from pathlib import Path
+
+from rethebes.topology import discover_linux_topology, read_text
+
+# Drivers of hwmon that report the temperature of the CPU
+core_temperature_drivers = ["coretemp"]
+package_temperature_drivers = ["coretemp", "k10temp", "zenpower", "cpu_thermal"]
+
+# Names of RAPL zones and corresponding names of sensors
+power_zones = {"package": "CPU Package", "core": "CPU Cores", "dram": "CPU Memory"}
+
+
+def natural_key(path):
+    # Sort hwmon10 after hwmon9
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", str(path))]
+
+
+def read_number(fd):
+    try:
+        return int(os.pread(fd, 32, 0))
+    except (OSError, ValueError):
+        return None
+
+
+class LinuxBackend:
+    missing_temperature_hint = "Make sure that the hwmon driver of your CPU (e.g. coretemp or k10temp) is loaded."
+
+    def __init__(self, root="/"):
+        self.root = Path(root)
+
+    def open(self):
+        self.descriptors = []
+        self.sensors = []
+        self.values = []
+        self.discover_topology()
+        self.discover_load()
+        self.discover_temperatures()
+        self.discover_clocks()
+        self.discover_power()
+        self.discover_voltages()
+        # Load and power are computed from differences of counters, which need a first reading
+        self.update_load()
+        self.update_power()
+
+    def close(self):
+        for fd in self.descriptors:
+            os.close(fd)
+        self.descriptors.clear()
+
+    def get_sensors(self):
+        return self.sensors
+
+    def subscribe(self, indexes):
+        self.indexes = indexes
+        # Load and temperatures are always updated, because some of their sensors are derived from the others
+        subscribed = set(indexes)
+        self.should_update_clocks = any(i in subscribed for i, _ in self.clocks)
+        self.should_update_power = any(p[0] in subscribed for p in self.powers)
+
+    def read(self, values, offset=0):
+        self.update()
+        for i, index in enumerate(self.indexes):
+            values[offset + i] = self.values[index]
+
+    def update(self):
+        self.update_load()
+        self.update_temperatures()
+        if self.should_update_clocks:
+            self.update_clocks()
+        if self.should_update_power:
+            self.update_power()
+
+    def add_sensor(self, stype, name):
+        self.sensors.append((stype, name))
+        self.values.append(None)
+        return len(self.sensors) - 1
+
+    def open_file(self, path):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        self.descriptors.append(fd)
+        return fd
+
+    def discover_topology(self):
+        # Threads are numbered from 1 within each core
+        topology = discover_linux_topology(self.root)
+        self.core_keys = [(c.package, c.core_id) for c in topology]
+        self.cores = [c.cpus for c in topology]
+
+    def discover_load(self):
+        self.load_indexes = dict()
+        self.previous_times = dict()
+        self.load_indexes["cpu"] = self.add_sensor("Load", "CPU Total")
+        self.load_max_index = self.add_sensor("Load", "CPU Core Max")
+        for i, threads in enumerate(self.cores):
+            for j, cpu in enumerate(threads):
+                self.load_indexes["cpu" + str(cpu)] = self.add_sensor(
+                    "Load", "CPU Core #" + str(i + 1) + " Thread #" + str(j + 1)
+                )
+        self.stat_fd = self.open_file(self.root / "proc/stat")
+        # Lines of CPUs come first and are shorter than 256 bytes, the rest of the file is not needed
+        self.stat_size = 256 * (len(self.load_indexes) + 1)
+
+    def update_load(self):
+        if self.stat_fd is None:
+            return
+        for line in os.pread(self.stat_fd, self.stat_size, 0).split(b"\n"):
+            if not line.startswith(b"cpu"):
+                break
+            fields = line.split()
+            label = fields[0].decode()
+            if label not in self.load_indexes:
+                continue
+            # user nice system idle iowait irq softirq steal (guest time is already in user)
+            times = [int(f) for f in fields[1:9]]
+            total = sum(times)
+            idle = times[3] + times[4]
+            if label in self.previous_times:
+                previous_total, previous_idle = self.previous_times[label]
+                if total > previous_total:
+                    busy = 1 - (idle - previous_idle) / (total - previous_total)
+                    self.values[self.load_indexes[label]] = 100 * busy
+            self.previous_times[label] = (total, idle)
+        loads = [
+            self.values[index]
+            for label, index in self.load_indexes.items()
+            if label != "cpu" and self.values[index] is not None
+        ]
+        if loads:
+            self.values[self.load_max_index] = max(loads)
+
+    def discover_temperatures(self):
+        core_fds = dict()
+        package_fd = None
+        fallback_fds = []  # E.g. CCDs of AMD processors
+        critical = dict()
+        for hwmon in sorted(
+            (self.root / "sys/class/hwmon").glob("hwmon*"), key=natural_key
+        ):
+            driver = read_text(hwmon / "name")
+            if driver not in package_temperature_drivers:
+                continue
+            labels = dict()
+            for path in hwmon.glob("temp*_input"):
+                prefix = path.name[: -len("_input")]
+                label = read_text(hwmon / (prefix + "_label"))
+                labels[label if label is not None else prefix] = prefix
+            package = 0
+            for label in labels:
+                if label.startswith("Package id"):
+                    package = int(label.split()[-1])
+            for label, prefix in labels.items():
+                path = hwmon / (prefix + "_input")
+                if driver in core_temperature_drivers and label.startswith("Core"):
+                    key = (package, int(label.split()[-1]))
+                    if key in self.core_keys:
+                        core_fds[key] = self.open_file(path)
+                        crit = read_text(hwmon / (prefix + "_crit"))
+                        if crit is not None:
+                            critical[key] = int(crit) / 1000
+                elif label.startswith("Tccd"):
+                    fallback_fds.append(self.open_file(path))
+                elif package_fd is None and (
+                    label.startswith("Package id") or label in ["Tdie", "Tctl", "temp1"]
+                ):
+                    if label == "Tctl" and "Tdie" in labels:
+                        continue
+                    package_fd = self.open_file(path)
+        self.core_temperatures = []
+        for i, key in enumerate(self.core_keys):
+            index = self.add_sensor("Temperature", "CPU Core #" + str(i + 1))
+            self.core_temperatures.append((index, core_fds.get(key)))
+        self.package_temperature = (
+            self.add_sensor("Temperature", "CPU Package"),
+            package_fd,
+        )
+        self.core_max_index = self.add_sensor("Temperature", "Core Max")
+        self.core_average_index = self.add_sensor("Temperature", "Core Average")
+        self.fallback_temperature_fds = [fd for fd in fallback_fds if fd is not None]
+        self.distances = []
+        for i, key in enumerate(self.core_keys):
+            index = self.add_sensor(
+                "Temperature", "CPU Core #" + str(i + 1) + " Distance to TjMax"
+            )
+            self.distances.append((index, critical.get(key)))
+
+    def update_temperatures(self):
+        temperatures = []
+        for index, fd in self.core_temperatures:
+            if fd is not None:
+                value = read_number(fd)
+                self.values[index] = value / 1000 if value is not None else None
+                if value is not None:
+                    temperatures.append(value / 1000)
+        for (index, tjmax), (core_index, _) in zip(
+            self.distances, self.core_temperatures
+        ):
+            if tjmax is not None and self.values[core_index] is not None:
+                self.values[index] = tjmax - self.values[core_index]
+        index, fd = self.package_temperature
+        if fd is not None:
+            value = read_number(fd)
+            self.values[index] = value / 1000 if value is not None else None
+        if not temperatures:
+            for fd in self.fallback_temperature_fds:
+                value = read_number(fd)
+                if value is not None:
+                    temperatures.append(value / 1000)
+        if temperatures:
+            self.values[self.core_max_index] = max(temperatures)
+            self.values[self.core_average_index] = sum(temperatures) / len(temperatures)
+
+    def discover_clocks(self):
+        # LHM reports one clock per physical core, we use its first thread
+        self.clocks = []
+        for i, threads in enumerate(self.cores):
+            index = self.add_sensor("Clock", "CPU Core #" + str(i + 1))
+            path = (
+                self.root
+                / "sys/devices/system/cpu"
+                / ("cpu" + str(threads[0]))
+                / "cpufreq/scaling_cur_freq"
+            )
+            fd = self.open_file(path)
+            if fd is not None:
+                self.clocks.append((index, fd))
+
+    def update_clocks(self):
+        for index, fd in self.clocks:
+            value = read_number(fd)
+            self.values[index] = value / 1000 if value is not None else None  # MHz
+
+    def discover_power(self):
+        zones = dict()
+        powercap = self.root / "sys/class/powercap"
+        paths = list(powercap.glob("*rapl:0")) + list(powercap.glob("*rapl:0:*"))
+        for path in sorted(paths, key=natural_key):
+            zone = read_text(path / "name")
+            if zone is None:
+                continue
+            zone = zone.split("-")[0]  # package-0 -> package
+            if zone in power_zones and zone not in zones:
+                zones[zone] = path
+        self.powers = []
+        for zone, name in power_zones.items():
+            index = self.add_sensor("Power", name)
+            if zone not in zones:
+                continue
+            # Reading energy usually requires elevated privileges
+            fd = self.open_file(zones[zone] / "energy_uj")
+            if fd is None:
+                continue
+            max_range = read_text(zones[zone] / "max_energy_range_uj")
+            max_range = int(max_range) if max_range is not None else None
+            self.powers.append([index, fd, max_range, None, None])
+
+    def update_power(self):
+        for power in self.powers:
+            index, fd, max_range, previous_energy, previous_time = power
+            energy = read_number(fd)
+            now = time.monotonic()
+            if energy is None:
+                continue
+            if previous_energy is not None and now > previous_time:
+                delta = energy - previous_energy
+                if delta < 0 and max_range is not None:  # Counter wrapped around
+                    delta += max_range
+                self.values[index] = delta / (now - previous_time) / 1e6  # W
+            power[3] = energy
+            power[4] = now
+
+    def discover_voltages(self):
+        # Core voltages are not exposed by a generic kernel interface
+        for i in range(len(self.cores)):
+            self.add_sensor("Voltage", "CPU Core #" + str(i + 1))
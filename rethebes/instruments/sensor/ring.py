@@ -0,0 +1,64 @@
+"""
+Ring buffer of fixed-width float64 rows in shared memory, with a single writer and a single reader.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+header_size = 8  # Bytes, holds the number of rows written since the beginning
+
+
+class RingBuffer:
+    def __init__(self, width, capacity, name=None):
+        # Without a name, shared memory is created, otherwise an existing one is attached
+        self.width = width
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(
+            name=name,
+            create=name is None,
+            size=header_size + 8 * width * capacity,
+        )
+        self.name = self.shm.name
+        self.counter = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray(
+            (capacity, width), dtype=np.float64, buffer=self.shm.buf, offset=header_size
+        )
+        if name is None:
+            self.counter[0] = 0
+        self.read_count = 0
+        self.dropped = 0
+
+    def close(self):
+        # Views must be released before closing the shared memory
+        self.counter = None
+        self.data = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+    def write(self, row):
+        # None values are stored as NaN
+        count = int(self.counter[0])
+        self.data[count % self.capacity] = row
+        self.counter[0] = count + 1
+
+    def read(self):
+        # Returns a copy of all the rows written since the previous read
+        count = int(self.counter[0])
+        if count - self.read_count > self.capacity:
+            self.dropped += count - self.capacity - self.read_count
+            self.read_count = count - self.capacity
+        rows = self.data[np.arange(self.read_count, count) % self.capacity]
+        # The writer might have overwritten the oldest rows while they were being copied
+        # including the row it is writing now, which might be incomplete
+        overwritten = int(self.counter[0]) + 1 - self.capacity - self.read_count
+        if overwritten > 0:
+            self.dropped += overwritten
+            rows = rows[overwritten:]
+        self.read_count = count
+        return rows
@@ -1,46 +1,109 @@
 """
-Module that uses LibreHardwareMonitor to read status of CPU.
+Module that reads status of CPU, using LibreHardwareMonitor on Windows and sysfs on Linux, or a synthetic model.
 
 Authors: Giulio Foletto.
 License: See project-level license file.
 """
 
-import csv
 import datetime
 import logging
+import math
+import multiprocessing
 import time
 from pathlib import Path
 
-from HardwareMonitor import Hardware
+from rethebes.instrulib import DeadlineClock, Instrument
 
-from rethebes.instrulib import Instrument
+from .acquisition import (
+    acquire,
+    create_load_command,
+    create_worker_telemetry,
+    process_load_event,
+)
+from .adaptive import create_adaptive_sampling
+from .aggregator import Aggregator
+from .cpu import CPU, create_backend
+from .ring import RingBuffer
+from .writer import BatchedWriter, ColumnarWriter
 
-from .cpu import CPU
+drain_interval = 0.1  # Seconds between reads of the ring buffer in process acquisition
+ring_duration = 60  # Seconds of samples that fit in the ring buffer
 
 
 class Sensor(Instrument):
     def __init__(self, name, context, configuration):
         self.configuration = configuration
+        self.first_run = True
+        # Subtracted from the times of written rows, set by the agent of a remote sensor
+        self.clock_offset = datetime.timedelta(0)
         super().__init__(name, context)
+        if self.configuration["record_telemetry"]:
+            # The loader publishes the telemetry of its workers on the data plane
+            self.data_subscription = {"headers": ["loader-data"]}
 
     def open(self):
         self.sampling_interval = self.configuration["sampling_interval"]
+        self.acquisition = self.configuration["acquisition"]
         self.should_write = self.configuration["write"]
         self.path = Path(self.configuration["file_name"]).resolve()
+        self.writer = None
+        self.aggregator = None
+        if (
+            self.configuration["backend"] == "synthetic"
+            or self.configuration["adaptive_sampling"]
+            or self.configuration["record_command"]
+        ):
+            # The synthetic backend models the load commanded by the loader,
+            # adaptive sampling is fast after every change of load,
+            # and the command can be recorded with the measurements
+            self.subscribed_headers = ["loader-event"]
 
-        self.pc = Hardware.Computer()
-        self.pc.IsCpuEnabled = True
-        self.pc.Open()
-        self.cpu = CPU(self.pc.Hardware[0])
+        if self.acquisition == "process":
+            # Forking a process with several threads might deadlock, so always spawn
+            context = multiprocessing.get_context("spawn")
+            self.connection, child_connection = context.Pipe()
+            self.process = context.Process(
+                target=acquire, args=(self.configuration, child_connection)
+            )
+            self.process.start()
+            handshake = self.receive_from_process()
+            if handshake is None:
+                self.process_internal_error(
+                    "Sensor acquisition process ended before it was ready"
+                )
+                return
+            names, test_values, missing_temperature_hint = handshake
+        elif self.acquisition == "thread":
+            self.clock = DeadlineClock(
+                self.sampling_interval, self.configuration["catch_up"]
+            )
+            self.backend = create_backend(self.configuration)
+            self.backend.open()
+            self.cpu = CPU(self.backend, self.configuration["sensors"])
+            self.command = create_load_command(self.configuration, self.backend)
+            self.telemetry = create_worker_telemetry(self.configuration, self.backend)
+            names = self.cpu.names
+            self.adaptive = create_adaptive_sampling(self.configuration, names)
+            test_values = self.cpu.read()
+            if self.command is not None:
+                names = names + self.command.names
+            if self.telemetry is not None:
+                names = names + self.telemetry.names
+            missing_temperature_hint = self.backend.missing_temperature_hint
+        else:
+            raise ValueError("Unknown acquisition: " + self.acquisition)
+        # Row buffer that is reused for every sample, Time comes first
+        self.columns = ["Time"] + names
+        self.row = [None] * len(self.columns)
 
-        # Test reading
-        test_read = self.cpu.read()
+        # Test reading, completeness can be checked only if the package temperature is subscribed
+        test_read = dict(zip(names, test_values))
         if not bool(test_read):
             self.process_internal_error(
-                "Reading sensors failed. Check your LHM installation."
+                "Reading sensors failed. Check your sensor backend installation."
             )
-        elif test_read["Temperature CPU Package"] is None:
-            msg = "Could not read temperature. This is most likely due to rethebes not running with elevated privileges. Please re-execute in an elevated terminal."
+        elif test_read.get("Temperature CPU Package", 0) is None:
+            msg = "Could not read temperature. " + missing_temperature_hint
             if (
                 "accept_incomplete_data" in self.configuration
                 and self.configuration["accept_incomplete_data"]
@@ -51,39 +114,179 @@ class Sensor(Instrument):
                 return
 
         if self.should_write:
+            columns = self.columns
+            if self.configuration["aggregation_interval"] is not None:
+                # Only aggregated rows are written, raw rows are still sent
+                self.aggregator = Aggregator(
+                    self.columns, self.configuration["aggregation_interval"]
+                )
+                columns = self.aggregator.columns
             directory = self.path.parent.resolve()
             if not directory.exists():
                 directory.mkdir(parents=True)
                 logging.info("Created directory " + directory)
-            self.file = open(self.configuration["file_name"], "w", newline="")
-            self.writer = csv.writer(self.file, delimiter=",")
-            self.header_written = False
+            output_format = self.configuration["output_format"]
+            flush_settings = (
+                self.configuration["flush_rows"],
+                self.configuration["flush_interval"],
+                self.configuration["fsync"],
+            )
+            if output_format == "csv":
+                self.writer = BatchedWriter(self.path, columns, *flush_settings)
+            elif output_format == "columnar":
+                self.writer = ColumnarWriter(
+                    self.path,
+                    columns,
+                    *flush_settings,
+                    self.configuration["output_dtype"],
+                )
+            else:
+                raise ValueError("Unknown output format: " + output_format)
+            self.writer.start()
 
     def close(self):
-        if self.should_write and self.path.exists():
-            logging.info("Sensor data saved correctly in " + str(self.path))
-            self.file.close()
+        if self.acquisition == "process":
+            self.close_process()
+        elif not self.first_run:
+            logging.info("Sensor sampling lateness: " + self.clock.report())
+        if self.writer is not None:
+            if self.aggregator is not None:
+                row = self.aggregator.finish()
+                if row is not None:
+                    self.writer.write(row)
+            self.writer.close()
+            if self.writer.error is None:
+                logging.info("Sensor data saved correctly in " + str(self.path))
+            else:
+                logging.error(
+                    "Sensor data could not be saved in "
+                    + str(self.path)
+                    + ": "
+                    + repr(self.writer.error)
+                )
+        if self.acquisition == "thread":
+            self.backend.close()
+
+    def close_process(self):
+        # The process might have ended already, e.g. with CTRL+C, and then it sends no report
+        self.send_to_process(None)
+        report = None if self.first_run else self.receive_from_process(5)
+        self.process.join()
+        self.connection.close()
+        if self.first_run:
+            return
+        # Rows sampled before the end of the process are still in the ring buffer
+        self.drain()
+        if report is not None:
+            logging.info("Sensor sampling lateness: " + report)
+        else:
+            logging.warning("Sensor acquisition process ended without report")
+        if self.ring.dropped > 0:
+            logging.warning(
+                "Sensor ring buffer overflowed, "
+                + str(self.ring.dropped)
+                + " samples were lost"
+            )
+        self.ring.close()
+        self.ring.unlink()
+
+    def send_to_process(self, message):
+        # Messages to a process that has ended are lost, and its end is handled at closure
+        try:
+            self.connection.send(message)
+        except OSError:
+            pass
+
+    def receive_from_process(self, timeout=None):
+        # None if the process ends without sending, or does not send within timeout seconds
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while not self.connection.poll(0.1):
+                if not self.process.is_alive():
+                    return None
+                if deadline is not None and time.monotonic() > deadline:
+                    return None
+            return self.connection.recv()
+        except (EOFError, OSError):
+            return None
+
+    def get_timeout(self):
+        if self.first_run:
+            return 0
+        if self.acquisition == "process":
+            return max(0, self.next_drain - time.monotonic())
+        return self.clock.get_timeout()
 
     def run(self):
-        stop_period = time.time() + self.sampling_interval
-        self.act()
-        time.sleep(max(0, stop_period - time.time()))
+        if self.acquisition == "process":
+            self.run_process()
+            return
+        if self.first_run:
+            self.clock.start()
+            self.first_run = False
+        self.act(self.clock.tick())
 
-    def act(self):
-        values = {"Time": datetime.datetime.now().isoformat()}
-        values.update(self.cpu.read())
-        if self.should_write:
-            if not self.header_written:
-                self.writer.writerow(list(values.keys()))
-                self.header_written = True
-            self.writer.writerow(list(values.values()))
-        self.send_data(values)
-
-    def send_data(self, data):
-        event = dict()
-        event["sender"] = self.name
-        event["header"] = "sensor-data"
-        event["time"] = datetime.datetime.now().isoformat()
-        event["body"] = data
-        for s in self.sockets.values():
-            s.send_json(event)
+    def run_process(self):
+        if self.first_run:
+            capacity = max(1024, int(ring_duration / self.sampling_interval))
+            self.ring = RingBuffer(len(self.columns), capacity)
+            self.send_to_process(("ring", self.ring.name, capacity))
+            self.first_run = False
+        self.drain()
+        self.next_drain = time.monotonic() + drain_interval
+
+    def process_relayed_message(self, message):
+        if message["header"] == "loader-event":
+            if self.acquisition == "process":
+                self.send_to_process(("load", message["body"]))
+            else:
+                process_load_event(
+                    message["body"],
+                    self.backend,
+                    self.clock,
+                    self.adaptive,
+                    self.command,
+                )
+
+    def process_data_message(self, message):
+        if self.acquisition == "process":
+            self.send_to_process(("telemetry", message["body"]))
+        elif self.telemetry is not None:
+            self.telemetry.process_data(message["body"])
+
+    def drain(self):
+        # Rows are read from the ring buffer in batches, then processed as if they were sampled here
+        for values in self.ring.read():
+            self.row[0] = datetime.datetime.fromtimestamp(values[0])
+            self.row[1:] = [None if math.isnan(v) else v for v in values[1:].tolist()]
+            self.process_row()
+
+    def act(self, tick):
+        self.row[0] = self.clock.to_datetime(tick)
+        self.cpu.read(self.row, 1)
+        offset = 1 + len(self.cpu.names)
+        if self.command is not None:
+            self.command.read(self.row, offset, time.time())
+            offset += len(self.command.names)
+        if self.telemetry is not None:
+            self.telemetry.read(self.row, offset)
+        if self.adaptive is not None:
+            self.adaptive.update(tick, self.row, 1)
+            self.clock.set_interval(self.adaptive.get_interval(tick))
+        self.process_row()
+
+    def process_row(self):
+        row = self.row
+        if self.clock_offset and self.writer is not None:
+            # Published rows are instead corrected by the director
+            row = row.copy()
+            row[0] = row[0] - self.clock_offset
+        if self.aggregator is not None:
+            row = self.aggregator.add(row)
+            if row is not None:
+                self.writer.write(row)
+        elif self.writer is not None:
+            # Copy, because the row buffer is reused
+            self.writer.write(row.copy())
+        # The row buffer is encoded before it is reused
+        self.send_data("sensor-data", self.row, self.columns)
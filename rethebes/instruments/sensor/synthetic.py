@@ -0,0 +1,144 @@
+"""
+Synthetic sensor backend, which needs no hardware and is useful for deterministic tests and benchmarks.
+Each core is modeled as a first order RC thermal circuit heated by a power that depends on its load,
+and the load follows the start and stop events of the loader, including its profiles.
+Sensors are named like those of LibreHardwareMonitor, so that the data can be analyzed in the same way.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import math
+import random
+import time
+
+from rethebes.profiles import LoadCommand
+
+
+class SyntheticBackend:
+    missing_temperature_hint = ""  # Temperature is never missing
+
+    def __init__(
+        self,
+        cores=4,
+        threads_per_core=2,
+        ambient_temperature=30,  # °C
+        thermal_resistance=3,  # K/W, from each core to ambient
+        time_constant=10,  # s
+        idle_power=1,  # W per core
+        max_power=15,  # W per core, at full load and boost clock
+        uncore_power=5,  # W
+        memory_power=2,  # W
+        tjmax=100,  # °C
+        throttle_margin=10,  # K, clocks start decreasing at tjmax - throttle_margin
+        base_clock=2000,  # MHz
+        boost_clock=4500,  # MHz
+        noise=0,  # K, standard deviation of the noise on temperatures
+        seed=0,
+    ):
+        self.cores = cores
+        self.threads_per_core = threads_per_core
+        self.ambient_temperature = ambient_temperature
+        self.thermal_resistance = thermal_resistance
+        self.time_constant = time_constant
+        self.idle_power = idle_power
+        self.max_power = max_power
+        self.uncore_power = uncore_power
+        self.memory_power = memory_power
+        self.tjmax = tjmax
+        self.throttle_margin = throttle_margin
+        self.base_clock = base_clock
+        self.boost_clock = boost_clock
+        self.noise = noise
+        self.random = random.Random(seed)
+
+    def open(self):
+        self.command = LoadCommand(self.cores)
+        self.loads = [0.0] * self.cores  # Commanded load of each core in [0, 1]
+        self.temperatures = [float(self.ambient_temperature)] * self.cores
+        self.clocks = [float(self.boost_clock)] * self.cores
+        self.powers = [float(self.idle_power)] * self.cores
+        self.last_update = time.monotonic()
+        self.sensors = []
+        for i in range(self.cores):
+            self.sensors.append(("Clock", "CPU Core #" + str(i + 1)))
+        for i in range(self.cores):
+            self.sensors.append(("Temperature", "CPU Core #" + str(i + 1)))
+        self.sensors.append(("Temperature", "CPU Package"))
+        self.sensors.append(("Temperature", "Core Max"))
+        self.sensors.append(("Temperature", "Core Average"))
+        for i in range(self.cores):
+            name = "CPU Core #" + str(i + 1) + " Distance to TjMax"
+            self.sensors.append(("Temperature", name))
+        self.sensors.append(("Load", "CPU Total"))
+        self.sensors.append(("Load", "CPU Core Max"))
+        for i in range(self.cores):
+            for j in range(self.threads_per_core):
+                name = "CPU Core #" + str(i + 1) + " Thread #" + str(j + 1)
+                self.sensors.append(("Load", name))
+        for i in range(self.cores):
+            self.sensors.append(("Voltage", "CPU Core #" + str(i + 1)))
+        self.sensors.append(("Power", "CPU Package"))
+        self.sensors.append(("Power", "CPU Cores"))
+        self.sensors.append(("Power", "CPU Memory"))
+
+    def close(self):
+        pass
+
+    def get_sensors(self):
+        return self.sensors
+
+    def subscribe(self, indexes):
+        self.indexes = indexes
+
+    def read(self, values, offset=0):
+        self.update()
+        all_values = self.get_all_values()
+        for i, index in enumerate(self.indexes):
+            values[offset + i] = all_values[index]
+
+    def process_load_event(self, body):
+        self.command.process_load_event(body)
+
+    def update(self):
+        now = time.monotonic()
+        dt = now - self.last_update
+        self.last_update = now
+        self.loads = [load / 100 for load in self.command.get_loads(time.time())]
+        decay = 1 - math.exp(-dt / self.time_constant)
+        for i in range(self.cores):
+            # Clocks decrease linearly to the base clock when approaching tjmax
+            headroom = (self.tjmax - self.temperatures[i]) / self.throttle_margin
+            headroom = min(1, max(0, headroom))
+            self.clocks[i] = (
+                self.base_clock + (self.boost_clock - self.base_clock) * headroom
+            )
+            dynamic_power = (self.max_power - self.idle_power) * self.loads[i]
+            self.powers[i] = (
+                self.idle_power + dynamic_power * self.clocks[i] / self.boost_clock
+            )
+            # Exact solution of the RC circuit for constant power during dt
+            steady_temperature = (
+                self.ambient_temperature + self.thermal_resistance * self.powers[i]
+            )
+            self.temperatures[i] += (steady_temperature - self.temperatures[i]) * decay
+
+    def get_all_values(self):
+        # In the same order as sensors
+        temperatures = [t + self.random.gauss(0, self.noise) for t in self.temperatures]
+        values = list(self.clocks)
+        values += temperatures
+        values.append(max(temperatures))  # Package
+        values.append(max(temperatures))
+        values.append(sum(temperatures) / self.cores)
+        values += [self.tjmax - t for t in temperatures]
+        values.append(100 * sum(self.loads) / self.cores)
+        values.append(100 * max(self.loads))
+        for load in self.loads:
+            values += [100 * load] * self.threads_per_core
+        values += [0.8 + 0.4 * clock / self.boost_clock for clock in self.clocks]
+        cores_power = sum(self.powers)
+        values.append(cores_power + self.uncore_power)
+        values.append(cores_power)
+        values.append(self.memory_power)
+        return values
@@ -0,0 +1,39 @@
+"""
+Telemetry of the workers of the loader, which the loader publishes on the data plane,
+and the sensor records in its output next to the measurements of the same logical CPUs.
+For each logical CPU, it includes the load achieved by the worker (%), the average sleep time of its controller (ms),
+and the throughput of its stress kernel (chunks of work per second, which depend on the kernel).
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import re
+
+quantities = ["Worker Load", "Worker Sleep", "Worker Throughput"]
+
+
+def list_threads(sensors):
+    # Names like CPU Core #1 Thread #1, among the (type, name) pairs of a backend
+    return [
+        name
+        for stype, name in sensors
+        if stype == "Load" and re.fullmatch(r"CPU Core #\d+ Thread #\d+", name)
+    ]
+
+
+class WorkerTelemetry:
+    def __init__(self, threads):
+        self.names = [q + " " + t for q in quantities for t in threads]
+        self.indexes = {name: i for i, name in enumerate(self.names)}
+        self.values = [None] * len(self.names)
+
+    def process_data(self, body):
+        # Values are kept until the next message, so every row has the latest ones
+        for name, value in body.items():
+            index = self.indexes.get(name)
+            if index is not None:
+                self.values[index] = value
+
+    def read(self, values, offset):
+        values[offset : offset + len(self.values)] = self.values
@@ -0,0 +1,138 @@
+"""
+Writers that save rows to file from a background thread, so that sampling never waits for the disk.
+Rows are queued and flushed in blocks, every flush_rows rows or every flush_interval seconds, whichever comes first.
+With fsync, each block is forced to disk, so that a crash loses at most one block.
+Errors of the thread, e.g. an unwritable path, are kept in error, and the rows that follow are discarded.
+BatchedWriter writes csv files, ColumnarWriter writes a directory of typed binary columns.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import csv
+import json
+import os
+import queue
+import time
+from threading import Thread
+
+import numpy as np
+
+
+class BatchedWriter(Thread):
+    def __init__(self, path, columns, flush_rows=100, flush_interval=1, fsync=False):
+        self.path = path
+        self.columns = columns
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.queue = queue.SimpleQueue()
+        self.rows_written = 0
+        self.error = None
+        super().__init__(name="writer")
+
+    def write(self, row):
+        # The row is stored as is, so it must not be modified afterwards
+        # Its first element is the time as a datetime
+        if self.error is None:
+            self.queue.put(row)
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        try:
+            self.open_file()
+        except Exception as e:
+            self.error = e
+            return
+        try:
+            self.write_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.close_file()
+
+    def write_all(self):
+        block = []
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                row = self.queue.get(timeout=max(0, next_flush - time.monotonic()))
+            except queue.Empty:
+                row = False  # Only flush
+            if row is None:
+                break
+            if row is not False:
+                block.append(row)
+            if len(block) >= self.flush_rows or time.monotonic() >= next_flush:
+                self.flush(block)
+                block.clear()
+                next_flush = time.monotonic() + self.flush_interval
+        self.flush(block)
+
+    def flush(self, block):
+        if not block:
+            return
+        self.write_block(block)
+        self.rows_written += len(block)
+
+    def open_file(self):
+        self.file = open(self.path, "w", newline="")
+        self.writer = csv.writer(self.file, delimiter=",")
+        self.writer.writerow(self.columns)
+
+    def write_block(self, block):
+        for row in block:
+            # Fixed width, so that times on whole seconds parse like the others
+            row[0] = row[0].isoformat(timespec="microseconds")
+        self.writer.writerows(block)
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def close_file(self):
+        self.file.close()
+
+
+class ColumnarWriter(BatchedWriter):
+    # The directory contains schema.json and one raw binary file per column, called 0.bin, 1.bin, ...
+    # Time is stored in 0.bin as int64 ns since the epoch,
+    # the other columns are stored as dtype, with NaN for missing values
+    # Every block is appended to all the files, which are therefore chunked by block
+    def __init__(
+        self,
+        path,
+        columns,
+        flush_rows=100,
+        flush_interval=1,
+        fsync=False,
+        dtype="float64",
+    ):
+        self.dtype = dtype
+        super().__init__(path, columns, flush_rows, flush_interval, fsync)
+
+    def open_file(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / "schema.json", "w") as f:
+            json.dump({"columns": self.columns, "dtype": self.dtype}, f)
+        self.files = [
+            open(self.path / (str(i) + ".bin"), "wb") for i in range(len(self.columns))
+        ]
+
+    def write_block(self, block):
+        times = [round(row[0].timestamp() * 1e6) * 1000 for row in block]
+        self.files[0].write(np.array(times, dtype=np.int64).tobytes())
+        values = np.array([row[1:] for row in block], dtype=np.float64)
+        values = values.astype(self.dtype).T
+        for f, column in zip(self.files[1:], values):
+            f.write(column.tobytes())
+        for f in self.files:
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def close_file(self):
+        for f in self.files:
+            f.close()
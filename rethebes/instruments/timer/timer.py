@@ -17,24 +17,27 @@ class Timer(Instrument):
         self.first_run = True
         super().__init__(name, context)
 
-    def run(self):
+    def get_timeout(self):
+        if self.first_run:
+            return 0
         if self.configuration["duration"] < 0:  # infinite run
-            if self.first_run:
+            return None
+        return max(0, self.stop_time - time.time())
+
+    def run(self):
+        if self.first_run:
+            if self.configuration["duration"] < 0:
                 logging.info(
                     "Starting infinite acquisition. Must be stopped with CTRL+C."
                 )
-                self.first_run = False
-            self.listen()
-        else:
-            if self.first_run:
+            else:
                 logging.info(
                     "Starting timer for "
                     + str(self.configuration["duration"])
                     + " seconds"
                 )
                 self.stop_time = time.time() + self.configuration["duration"]
-                self.first_run = False
-            self.listen((self.stop_time - time.time()) * 1000)  # Conversion to ms
-            if time.time() > self.stop_time:
-                self.send_event(command="finish")
-                self.set_state("waiting")
+            self.first_run = False
+            return
+        self.send_event(command="finish")
+        self.set_state("waiting")
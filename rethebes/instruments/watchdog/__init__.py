@@ -0,0 +1 @@
+from .watchdog import Watchdog
@@ -0,0 +1,128 @@
+"""
+Class that implements a watchdog instrument, which stops the test when the live sensor data violates safety limits.
+The limits are a maximum temperature, a maximum rate of increase of the temperature, a maximum power,
+and a maximum time without sensor data.
+The data comes from the data plane, and a violation raises a critical event, which makes the director close all instruments.
+The critical event carries the time of the offending sample, so that the loader can report how long it took to stop the load.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import collections
+import datetime
+import logging
+import time
+
+from rethebes.instrulib import Instrument
+
+
+class Watchdog(Instrument):
+    def __init__(self, name, context, configuration):
+        self.configuration = configuration
+        self.tripped = False
+        self.last_sample_time = None
+        self.history = (
+            collections.deque()
+        )  # Time and maximum temperature of recent samples
+        super().__init__(name, context)
+        # A short queue, so that the watchdog never lags far behind the sensor
+        self.data_subscription = {"headers": ["sensor-data"], "hwm": 10}
+
+    def get_timeout(self):
+        if self.tripped or self.configuration["stale_timeout"] is None:
+            return None
+        if self.last_sample_time is None:
+            self.last_sample_time = time.time()  # Counting from the start of the test
+        return max(
+            0, self.last_sample_time + self.configuration["stale_timeout"] - time.time()
+        )
+
+    def run(self):
+        # The violation is the absence of samples, so it happens now
+        self.trip(
+            "No sensor data for "
+            + str(self.configuration["stale_timeout"])
+            + " seconds",
+            time.time(),
+        )
+
+    def process_data_message(self, message):
+        if self.tripped or self.state != "running":
+            return
+        body = message["body"]
+        sample_time = datetime.datetime.fromisoformat(body["Time"]).timestamp()
+        self.last_sample_time = time.time()
+        temperatures = [
+            v
+            for k, v in body.items()
+            if k.startswith("Temperature")
+            and not k.endswith("Distance to TjMax")
+            and v is not None
+        ]
+        # Each limit set to None is skipped on its own
+        limit = self.configuration["max_temperature"]
+        if temperatures:
+            temperature = max(temperatures)
+            if limit is not None and temperature > limit:
+                self.trip(
+                    "Temperature "
+                    + format(temperature, ".1f")
+                    + " °C above limit of "
+                    + str(limit)
+                    + " °C",
+                    sample_time,
+                )
+                return
+            if self.check_rate(sample_time, temperature):
+                return
+        limit = self.configuration["max_power"]
+        power = body.get(self.configuration["power_sensor"])
+        if limit is not None and power is not None and power > limit:
+            self.trip(
+                "Power "
+                + format(power, ".1f")
+                + " W above limit of "
+                + str(limit)
+                + " W",
+                sample_time,
+            )
+
+    def check_rate(self, sample_time, temperature):
+        # The rate is measured over a window, because consecutive samples are too noisy
+        limit = self.configuration["max_temperature_rate"]
+        if limit is None:
+            return False
+        window = self.configuration["rate_window"]
+        self.history.append((sample_time, temperature))
+        while sample_time - self.history[0][0] > window:
+            self.history.popleft()
+        first_time, first_temperature = self.history[0]
+        if sample_time - first_time < window / 2:
+            return False
+        rate = (temperature - first_temperature) / (sample_time - first_time)
+        if rate > limit:
+            self.trip(
+                "Temperature rising at "
+                + format(rate, ".1f")
+                + " K/s, above limit of "
+                + str(limit)
+                + " K/s",
+                sample_time,
+            )
+            return True
+        return False
+
+    def trip(self, description, sample_time):
+        # sample_time is that of the offending sample, like time.time()
+        self.tripped = True
+        latency_ns = time.time_ns() - int(sample_time * 1e9)
+        logging.critical(
+            description
+            + ", detected "
+            + format(latency_ns / 1e6, ".1f")
+            + " ms after the sample"
+        )
+        self.send_event(
+            command="critical", description=description, sample_time=sample_time
+        )
@@ -0,0 +1,182 @@
+"""
+Load profiles, i.e. waveforms of the load commanded during a step of the loader, in % as a function of time.
+The loader evaluates them at every actuation period, and the sensor evaluates them again to record the command,
+which is the same since profiles are deterministic functions of the time since the start of the step.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import math
+import re
+
+import numpy as np
+
+
+def create_profile(spec, duration=-1):
+    # spec is a dict with a type and its parameters, or None for a constant load
+    # duration is that of the step, the default length of ramps
+    if spec is None:
+        return None
+    kind = spec["type"]
+    parameters = {k: v for k, v in spec.items() if k != "type"}
+    if kind == "ramp":
+        parameters.setdefault("duration", duration)
+        return RampProfile(**parameters)
+    elif kind == "sine":
+        return SineProfile(**parameters)
+    elif kind == "square":
+        return SquareProfile(**parameters)
+    elif kind == "prbs":
+        return PRBSProfile(**parameters)
+    elif kind == "csv":
+        return CSVProfile(**parameters)
+    else:
+        raise ValueError("Unknown profile: " + kind)
+
+
+class RampProfile:
+    def __init__(self, start, end, duration):
+        if duration <= 0:
+            raise ValueError("Ramps need a positive duration")
+        self.start = start
+        self.end = end
+        self.duration = duration
+
+    def value(self, t):
+        fraction = min(max(t / self.duration, 0), 1)
+        return clip(self.start + (self.end - self.start) * fraction)
+
+
+class SineProfile:
+    def __init__(self, mean, amplitude, period, phase=0):
+        self.mean = mean
+        self.amplitude = amplitude
+        self.period = period
+        self.phase = phase  # Degrees
+
+    def value(self, t):
+        angle = 2 * math.pi * t / self.period + math.radians(self.phase)
+        return clip(self.mean + self.amplitude * math.sin(angle))
+
+
+class SquareProfile:
+    def __init__(self, low, high, period, duty=0.5):
+        self.low = low
+        self.high = high
+        self.period = period
+        self.duty = duty  # Fraction of the period at high load, which comes first
+
+    def value(self, t):
+        return self.high if (t / self.period) % 1 < self.duty else self.low
+
+
+class PRBSProfile:
+    # Maximal length sequence of a linear feedback shift register, which switches between low and high load
+    # Taps of Fibonacci LFSRs for each order
+    taps = {
+        3: (3, 2),
+        4: (4, 3),
+        5: (5, 3),
+        6: (6, 5),
+        7: (7, 6),
+        8: (8, 6, 5, 4),
+        9: (9, 5),
+        10: (10, 7),
+    }
+
+    def __init__(self, low, high, bit_duration, order=7, seed=1):
+        if order not in self.taps:
+            raise ValueError("Unknown PRBS order: " + str(order))
+        self.low = low
+        self.high = high
+        self.bit_duration = bit_duration
+        state = seed % (2**order) or 1  # The state must not be zero
+        self.bits = []
+        for i in range(2**order - 1):
+            self.bits.append(state & 1)
+            feedback = 0
+            for tap in self.taps[order]:
+                feedback ^= (state >> (order - tap)) & 1
+            state = (state >> 1) | (feedback << (order - 1))
+
+    def value(self, t):
+        bit = self.bits[int(t / self.bit_duration) % len(self.bits)]
+        return self.high if bit else self.low
+
+
+class CSVProfile:
+    # Linear interpolation of a file with columns Time (s since the start of the step) and Load (%)
+    # Before the first time and after the last one, the load is that of the first and last row
+    def __init__(self, file_name, repeat=False):
+        # Imported here, because the workers of the loader import this module
+        import pandas as pd
+
+        data = pd.read_csv(file_name)
+        self.times = data["Time"].to_numpy(dtype=float)
+        self.loads = data["Load"].to_numpy(dtype=float)
+        self.repeat = repeat  # Start again after the last time
+
+    def value(self, t):
+        if self.repeat and self.times[-1] > 0:
+            t = t % self.times[-1]
+        return clip(float(np.interp(t, self.times, self.loads)))
+
+
+def clip(load):
+    return min(max(load, 0), 100)
+
+
+class LoadCommand:
+    # Load commanded to each core by the events of the loader, in %
+    # and time since the start of the step from which the temperature is steady, while it is
+    def __init__(self, cores):
+        self.names = ["Command CPU Core #" + str(i + 1) for i in range(cores)]
+        self.names.append("Settling Time")
+        self.loads = [0.0] * cores
+        self.profiles = [None] * cores
+        self.start_time = 0
+        self.settling_time = None
+
+    def process_load_event(self, body):
+        # Interface cores are numbered from 1
+        if body["command"] == "steady":
+            self.settling_time = body["settling_time"]
+        if body["command"] == "target":
+            # Loads adjusted during a step, e.g. to hold a temperature, replace those of its start
+            for core, load in zip(body["target_cores"], body["target_loads"]):
+                if 1 <= core <= len(self.loads):
+                    self.loads[core - 1] = load
+            return
+        if body["command"] not in ["start", "stop"]:
+            return
+        profile = None
+        self.settling_time = None
+        if body["command"] == "start":
+            profile = create_profile(body.get("profile"), body["duration"])
+            self.start_time = body.get("start_time", 0)
+        for core, load in zip(body["target_cores"], body["target_loads"]):
+            if 1 <= core <= len(self.loads):
+                self.loads[core - 1] = load if body["command"] == "start" else 0
+                self.profiles[core - 1] = profile
+
+    def get_loads(self, now):
+        # now is a timestamp like time.time()
+        return [
+            load if profile is None else profile.value(now - self.start_time)
+            for load, profile in zip(self.loads, self.profiles)
+        ]
+
+    def read(self, values, offset, now):
+        values[offset : offset + len(self.loads)] = self.get_loads(now)
+        values[offset + len(self.loads)] = self.settling_time
+
+
+def count_cores(sensors):
+    # Number of cores with load sensors, among the (type, name) pairs of a backend
+    cores = set()
+    for stype, name in sensors:
+        match = re.fullmatch(r"CPU Core #(\d+) Thread #\d+", name)
+        if stype == "Load" and match is not None:
+            cores.add(int(match.group(1)))
+    return max(cores, default=0)
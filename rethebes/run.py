@@ -5,34 +5,93 @@ Authors: Giulio Foletto.
 License: See project-level license file.
 """
 
+import asyncio
 import datetime
 
 import zmq
 
 from rethebes.analysis import analysis
-from rethebes.instruments import Loader, Manager, Sensor, Timer
-from rethebes.util import get_default_output_directory
+from rethebes.instrulib import Agent, RemoteInstrument
+from rethebes.instruments import (
+    AsyncManager,
+    Loader,
+    Manager,
+    Replay,
+    Sensor,
+    Timer,
+    Watchdog,
+)
+from rethebes.util import get_default_output_directory, output_suffixes
 
-known_instruments = {"loader": Loader, "sensor": Sensor, "timer": Timer}
+known_instruments = {
+    "loader": Loader,
+    "replay": Replay,
+    "sensor": Sensor,
+    "timer": Timer,
+    "watchdog": Watchdog,
+}
 
 default_configuration = {
     "instruments": ["loader", "sensor"],
     "analyze": False,
+    "codec": "json",
+    "runtime": "thread",
+    "remote": {},
     "loader": [
         {
             "target_cores": "all",
             "target_loads": 0,
             "duration": 5,
             "sampling_interval": 0.1,
+            "kernel": "scalar",
+            "measurement": "inline",
+            "profile": None,
+            "until": "duration",
+            "min_duration": 0,
+            "temperature_sensor": "Temperature CPU Package",
+            "steady_window": 10,
+            "steady_slope": 0.05,
+            "steady_hold": 5,
+            "target_temperature": None,
+            "temperature_kp": 0.02,
+            "temperature_ki": 0.002,
+            "telemetry_interval": 0.5,
         }
     ],
     "sensor": {
         "sampling_interval": 0.1,
+        "catch_up": False,
+        "adaptive_sampling": False,
+        "slow_sampling_interval": 1,
+        "transient_duration": 30,
+        "temperature_rate_threshold": 0.5,
+        "acquisition": "thread",
+        "acquisition_cpu": None,
+        "backend": "auto",
+        "synthetic": {},
+        "sensors": "all",
         "accept_incomplete_data": False,
         "write": True,
         "file_name": "auto",
+        "output_format": "csv",
+        "output_dtype": "float64",
+        "flush_rows": 100,
+        "flush_interval": 1,
+        "fsync": False,
+        "aggregation_interval": None,
+        "record_command": True,
+        "record_telemetry": True,
     },
     "timer": {"duration": 5},
+    "replay": {"file_name": None, "speed": 1},
+    "watchdog": {
+        "max_temperature": 95,
+        "max_temperature_rate": None,
+        "rate_window": 1,
+        "max_power": None,
+        "power_sensor": "Power CPU Package",
+        "stale_timeout": 5,
+    },
 }
 
 
@@ -43,6 +102,7 @@ def process_configuration(configuration):
     # Allow not including timer
     if (
         "loader" not in configuration["instruments"]
+        and "replay" not in configuration["instruments"]
         and "timer" not in configuration["instruments"]
     ):
         configuration["instruments"].append("timer")
@@ -50,11 +110,22 @@ def process_configuration(configuration):
     if "master" not in configuration:
         if "loader" in configuration["instruments"]:
             configuration["master"] = "loader"
+        elif "replay" in configuration["instruments"]:
+            configuration["master"] = "replay"
         else:
             configuration["master"] = "timer"
     # Allow not setting analyze after run
     if "analyze" not in configuration:
         configuration["analyze"] = default_configuration["analyze"]
+    # Allow not setting codec
+    if "codec" not in configuration:
+        configuration["codec"] = default_configuration["codec"]
+    # Allow not setting runtime
+    if "runtime" not in configuration:
+        configuration["runtime"] = default_configuration["runtime"]
+    # Allow not setting remote instruments
+    if "remote" not in configuration:
+        configuration["remote"] = default_configuration["remote"]
     # Allow loading of settings from default
     for instrument in configuration["instruments"]:
         if instrument not in configuration:
@@ -82,24 +153,69 @@ def process_configuration(configuration):
             datetime.datetime.now()
             .isoformat(sep="-", timespec="seconds")
             .replace(":", "-")
-            + ".csv"
+            + output_suffixes[configuration["sensor"]["output_format"]]
         )
         configuration["sensor"]["file_name"] = (
             get_default_output_directory() / file_name
         )
+    # Remote instruments cannot receive data, which stays on the local data plane
+    remote = configuration["remote"]
+    if "loader" in remote and any(
+        load["until"] == "steady" or load["target_temperature"] is not None
+        for load in configuration["loader"]
+    ):
+        raise ValueError(
+            "A remote loader cannot end steps at steady state or hold a temperature"
+        )
+    if "watchdog" in remote:
+        raise ValueError("The watchdog cannot be remote")
+    if "sensor" in remote:
+        # The telemetry of the workers is published by the loader on the local data plane
+        configuration["sensor"] = dict(configuration["sensor"], record_telemetry=False)
     return configuration
 
 
 def run(configuration):
     configuration = process_configuration(configuration)
-    context = zmq.Context(0)
-    instruments = [
-        known_instruments[i](i, context, configuration[i])
-        for i in configuration["instruments"]
-    ]
-    manager = Manager("manager", context, instruments, configuration["master"])
+    # inproc needs no I/O thread, TCP does
+    context = zmq.Context(1 if configuration["remote"] else 0)
+    instruments = []
+    for i in configuration["instruments"]:
+        if i in configuration["remote"]:
+            # Hosted by the agent at the given address
+            instruments.append(
+                RemoteInstrument(
+                    i, context, configuration["remote"][i], i, configuration[i]
+                )
+            )
+        else:
+            instruments.append(known_instruments[i](i, context, configuration[i]))
+    arguments = (
+        "manager",
+        context,
+        instruments,
+        configuration["master"],
+        configuration["codec"],
+    )
     # This executes everything
-    manager.main()
+    if configuration["runtime"] == "thread":
+        Manager(*arguments).main()
+    elif configuration["runtime"] == "asyncio":
+        asyncio.run(AsyncManager(*arguments).main())
+    else:
+        raise ValueError("Unknown runtime: " + configuration["runtime"])
     context.term()
-    if configuration["analyze"] and configuration["sensor"]["write"]:
+    # The output of a remote sensor is on its own machine
+    if (
+        configuration["analyze"]
+        and configuration["sensor"]["write"]
+        and "sensor" not in configuration["remote"]
+    ):
         analysis(configuration["sensor"]["file_name"])
+
+
+def serve(endpoint):
+    # Host instruments for remote directors, until CTRL+C
+    context = zmq.Context(1)
+    Agent(context, endpoint, known_instruments).serve()
+    context.term()
@@ -0,0 +1,157 @@
+"""
+Discovery of the topology of the CPU, i.e. which logical CPUs belong to which physical core,
+and the package, NUMA node and type (performance or efficiency) of each core.
+On Linux, it is read from sysfs, elsewhere it is inferred from the number of logical and physical cores.
+At interface level, cores are numbered from 1 in order of (package, core id), like the sensors of LHM.
+The numbers are kept when the topology is restricted to the logical CPUs available to the process.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import os
+from pathlib import Path
+
+
+class Core:
+    def __init__(self, number, cpus, package=0, core_id=None, node=0, core_type=None):
+        self.number = number  # From 1
+        self.cpus = cpus  # Logical CPUs, as numbered by the operating system
+        self.package = package
+        self.core_id = core_id if core_id is not None else number - 1
+        self.node = node
+        self.core_type = core_type  # "performance", "efficiency" or None if not hybrid
+
+
+def read_text(path):
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return None
+
+
+def parse_cpu_list(text):
+    # Like 0-3,8,10-11
+    cpus = []
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus += list(range(int(first), int(last) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+def discover_topology(root="/"):
+    cores = discover_linux_topology(Path(root))
+    if not cores:  # Not Linux
+        cores = infer_topology()
+    return cores
+
+
+def discover_linux_topology(root):
+    cpu_dir = root / "sys/devices/system/cpu"
+    groups = dict()
+    nodes = dict()
+    for path in cpu_dir.glob("cpu[0-9]*"):
+        package = read_text(path / "topology/physical_package_id")
+        core = read_text(path / "topology/core_id")
+        if package is None or core is None:  # Offline CPU
+            continue
+        cpu = int(path.name[3:])
+        groups.setdefault((int(package), int(core)), []).append(cpu)
+        for node in path.glob("node[0-9]*"):
+            nodes[cpu] = int(node.name[4:])
+    # Hybrid Intel processors list their performance and efficiency cores separately
+    types = dict()
+    for device, core_type in [("cpu_core", "performance"), ("cpu_atom", "efficiency")]:
+        text = read_text(root / "sys/devices" / device / "cpus")
+        if text is not None:
+            for cpu in parse_cpu_list(text):
+                types[cpu] = core_type
+    cores = []
+    for i, key in enumerate(sorted(groups)):
+        cpus = sorted(groups[key])
+        cores.append(
+            Core(i + 1, cpus, key[0], key[1], nodes.get(cpus[0], 0), types.get(cpus[0]))
+        )
+    return cores
+
+
+def infer_topology():
+    # Windows numbers the threads of each core contiguously
+    # Hybrid processors have more logical than physical cores, but not a multiple of them,
+    # and their first cores are the performance ones, with two threads
+    import psutil
+
+    logical = psutil.cpu_count(logical=True)
+    physical = psutil.cpu_count(logical=False) or logical
+    if logical % physical == 0:
+        sizes = [logical // physical] * physical
+        types = [None] * physical
+    else:
+        smt = logical - physical
+        sizes = [2] * smt + [1] * (physical - smt)
+        types = ["performance"] * smt + ["efficiency"] * (physical - smt)
+    cores = []
+    cpu = 0
+    for i, size in enumerate(sizes):
+        cores.append(Core(i + 1, list(range(cpu, cpu + size)), core_type=types[i]))
+        cpu += size
+    return cores
+
+
+def available_cpus(cores):
+    # Logical CPUs on which this process may run, fewer than all in containers or under taskset
+    if hasattr(os, "sched_getaffinity"):
+        return os.sched_getaffinity(0)
+    return {cpu for core in cores for cpu in core.cpus}
+
+
+def restrict_topology(cores, cpus):
+    # Cores with their logical CPUs among cpus, the others are dropped
+    restricted = []
+    for core in cores:
+        allowed = [cpu for cpu in core.cpus if cpu in cpus]
+        if allowed:
+            restricted.append(
+                Core(
+                    core.number,
+                    allowed,
+                    core.package,
+                    core.core_id,
+                    core.node,
+                    core.core_type,
+                )
+            )
+    return restricted
+
+
+def select_cores(cores, selection):
+    # Returns the numbers of the cores that match the selection, which is "all", a number, a list of numbers,
+    # or a dict with any of the keys package, core_id, node and type, whose values are single values or lists
+    if selection == "all":
+        return [c.number for c in cores]
+    if isinstance(selection, int):
+        return [selection]
+    if isinstance(selection, list):
+        return selection
+    attributes = {
+        "package": "package",
+        "core_id": "core_id",
+        "node": "node",
+        "type": "core_type",
+    }
+    selected = []
+    for core in cores:
+        matches = True
+        for key, value in selection.items():
+            if key not in attributes:
+                raise ValueError("Unknown core selection: " + key)
+            values = value if isinstance(value, list) else [value]
+            matches = matches and getattr(core, attributes[key]) in values
+        if matches:
+            selected.append(core.number)
+    if not selected:
+        raise ValueError("No core matches selection: " + repr(selection))
+    return selected
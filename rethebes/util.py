@@ -9,6 +9,9 @@ import logging
 import sys
 from pathlib import Path
 
+# Sensor output files (or directories) are named with these suffixes, according to the output format
+output_suffixes = {"csv": ".csv", "columnar": ".columns"}
+
 
 def configure_logging():
     logging.basicConfig(
@@ -41,3 +44,14 @@ def get_default_config_directory(create=False):
     if create and not config_dir.exists():
         config_dir.mkdir()
     return config_dir
+
+
+def find_output_file(name):
+    # Allow referring to output files in the default folder by name only
+    candidates = [Path(name).resolve(), get_default_output_directory() / name]
+    for suffix in output_suffixes.values():
+        candidates.append(get_default_output_directory() / (name + suffix))
+    for path in candidates:
+        if path.exists():
+            return path
+    return None
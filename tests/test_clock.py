@@ -0,0 +1,39 @@
+"""
+Test facility for the deadline clock.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import time
+
+from rethebes.instrulib import DeadlineClock, Histogram
+
+
+def test_histogram():
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.add(value)
+    assert histogram.max == 1000
+    assert histogram.percentile(50) <= 500 < histogram.percentile(50) * 1.07
+    assert histogram.percentile(99) <= 990 < histogram.percentile(99) * 1.07
+
+
+def test_missed_ticks():
+    clock = DeadlineClock(0.01)
+    clock.start()
+    clock.tick()
+    time.sleep(0.035)  # Miss at least two ticks
+    clock.tick()
+    assert clock.missed_ticks >= 2
+    assert clock.get_timeout() <= 0.01
+    assert clock.lateness.max >= 0.015 * 1e9
+
+    clock = DeadlineClock(0.01, catch_up=True)
+    clock.start()
+    clock.tick()
+    time.sleep(0.035)
+    for _ in range(2):
+        clock.tick()
+        assert clock.get_timeout() == 0  # Still late, ticks are not skipped
+    assert clock.missed_ticks == 0
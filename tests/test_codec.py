@@ -0,0 +1,91 @@
+"""
+Test facility for the codecs of the instrument bus.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import datetime
+import sys
+
+import pytest
+import zmq
+
+from rethebes.instrulib import create_codec
+
+
+def make_message(body):
+    return {
+        "sender": "sensor",
+        "header": "sensor-data",
+        "time": "2024-01-01T00:00:00",
+        "body": body,
+    }
+
+
+@pytest.mark.parametrize("name", ["json", "msgpack", "frame"])
+def test_round_trip(name):
+    if name == "msgpack":
+        pytest.importorskip("msgpack")
+    context = zmq.Context()
+    sender = context.socket(zmq.PAIR)
+    sender.bind("inproc://test_codec")
+    receiver = context.socket(zmq.PAIR)
+    receiver.connect("inproc://test_codec")
+    encoder = create_codec(name)
+    decoder = create_codec(name)
+    event = make_message({"command": "ready", "subscribed_headers": []})
+    data = [
+        make_message({"Time": "2024-01-01T00:00:00.1", "A": 1.5, "B": None}),
+        make_message({"Time": "2024-01-01T00:00:00.2", "A": 2.5, "B": 3}),
+        make_message({"Time": "2024-01-01T00:00:00.3", "C": 4.5}),  # New schema
+    ]
+    encoder.send(sender, event)
+    for message in data:
+        encoder.send_data(sender, message)
+    received = []
+    while len(received) < 1 + len(data):
+        message = decoder.recv(receiver)
+        if message is not None:
+            received.append(message)
+    sender.close()
+    receiver.close()
+    context.term()
+    assert received == [event] + data
+
+
+@pytest.mark.parametrize("name", ["json", "msgpack", "frame"])
+def test_rows(name):
+    # Rows of declared columns are received as dicts
+    if name == "msgpack":
+        pytest.importorskip("msgpack")
+    context = zmq.Context()
+    sender = context.socket(zmq.PAIR)
+    sender.bind("inproc://test_codec")
+    receiver = context.socket(zmq.PAIR)
+    receiver.connect("inproc://test_codec")
+    encoder = create_codec(name)
+    decoder = create_codec(name)
+    columns = ["Time", "A", "B"]
+    row = [datetime.datetime(2024, 1, 1, 0, 0, 0, 123456), 1.5, None]
+    for i in range(3):
+        row[1] = i  # The buffer is reused
+        encoder.send_data(sender, make_message(row), columns)
+    received = []
+    while len(received) < 3:
+        message = decoder.recv(receiver)
+        if message is not None:
+            received.append(message["body"])
+    sender.close()
+    receiver.close()
+    context.term()
+    assert received == [
+        {"Time": "2024-01-01T00:00:00.123456", "A": i, "B": None} for i in range(3)
+    ]
+
+
+def test_missing_msgpack(monkeypatch):
+    # Importing a module that is None in sys.modules fails
+    monkeypatch.setitem(sys.modules, "msgpack", None)
+    with pytest.raises(ImportError, match=r"rethebes\[msgpack\]"):
+        create_codec("msgpack")
@@ -0,0 +1,58 @@
+"""
+Test facility for the publish/subscribe data plane.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import time
+
+import pytest
+import zmq
+
+from rethebes.instrulib import Instrument
+from rethebes.instruments import Sensor, Timer
+from rethebes.instruments.manager import Manager
+from rethebes.run import process_configuration
+
+
+class Consumer(Instrument):
+    def __init__(self, name, context, delay, hwm):
+        self.delay = delay
+        self.received = 0
+        super().__init__(name, context)
+        self.data_subscription = {"headers": ["sensor-data"], "hwm": hwm}
+
+    def process_data_message(self, message):
+        self.received += 1
+        time.sleep(self.delay)
+
+
+@pytest.mark.parametrize("codec", ["json", "frame"])
+def test_slow_subscriber(codec):
+    configuration = process_configuration(
+        {
+            "instruments": ["timer", "sensor"],
+            "timer": {"duration": 1},
+            "sensor": {
+                "sampling_interval": 0.01,
+                "backend": "synthetic",
+                "write": False,
+            },
+        }
+    )
+    context = zmq.Context(0)
+    sensor = Sensor("sensor", context, configuration["sensor"])
+    fast = Consumer("fast", context, 0, 1000)
+    slow = Consumer("slow", context, 0.1, 1)
+    instruments = [Timer("timer", context, configuration["timer"]), sensor, fast, slow]
+    manager = Manager("manager", context, instruments, "timer", codec)
+    manager.main()
+    context.term()
+    samples = sensor.clock.ticks
+    assert samples > 80
+    assert sensor.clock.missed_ticks < 5  # The slow subscriber does not stall sampling
+    assert fast.received >= samples - 1
+    assert fast.data_dropped == 0
+    assert slow.received < samples / 2
+    assert slow.data_dropped > 0
@@ -0,0 +1,106 @@
+"""
+Test facility for the instrument runtime.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import asyncio
+import logging
+
+import pytest
+import zmq
+
+from rethebes.instrulib import AsyncInstrument
+from rethebes.instruments import AsyncManager, Manager, Sensor, Timer
+from rethebes.run import process_configuration
+
+
+def test_idle_cpu_time(caplog):
+    configuration = process_configuration(
+        {
+            "instruments": ["timer", "sensor"],
+            "timer": {"duration": 2},
+            "sensor": {
+                "sampling_interval": 0.5,
+                "backend": "synthetic",
+                "write": False,
+            },
+        }
+    )
+    context = zmq.Context(0)
+    timer = Timer("timer", context, configuration["timer"])
+    sensor = Sensor("sensor", context, configuration["sensor"])
+    manager = Manager("manager", context, [timer, sensor], "timer")
+    caplog.set_level(logging.INFO)
+    manager.main()
+    context.term()
+    # Instruments block until their next deadline, rather than polling
+    assert timer.cpu_time_ns < 0.05e9
+    assert sensor.cpu_time_ns < 0.1e9
+    assert "CPU time of threads: manager" in caplog.text
+
+
+class Counter(AsyncInstrument):
+    # Counts the data of the sensor, as a task of the event loop
+    def __init__(self, name, context):
+        super().__init__(name, context)
+        self.data_subscription = {"headers": ["sensor-data"]}
+        self.count = 0
+
+    def get_timeout(self):
+        return None
+
+    def process_data_message(self, message):
+        self.count += 1
+
+
+def test_asyncio_runtime():
+    configuration = process_configuration(
+        {
+            "instruments": ["timer", "sensor"],
+            "timer": {"duration": 2},
+            "sensor": {
+                "sampling_interval": 0.1,
+                "backend": "synthetic",
+                "write": False,
+            },
+        }
+    )
+    context = zmq.Context(0)
+    timer = Timer("timer", context, configuration["timer"])
+    sensor = Sensor("sensor", context, configuration["sensor"])
+    counter = Counter("counter", context)
+    manager = AsyncManager("manager", context, [timer, sensor, counter], "timer")
+    asyncio.run(manager.main())
+    context.term()
+    # The sensor runs unmodified in a thread, the counter in the event loop
+    assert counter.count > 10
+
+
+def test_asyncio_cancellation():
+    # Like CTRL+C, which cancels the main task: instruments close, then the task is cancelled
+    configuration = process_configuration(
+        {
+            "instruments": ["timer", "sensor"],
+            "timer": {"duration": 60},
+            "sensor": {"backend": "synthetic", "write": False},
+        }
+    )
+    context = zmq.Context(0)
+    timer = Timer("timer", context, configuration["timer"])
+    sensor = Sensor("sensor", context, configuration["sensor"])
+    counter = Counter("counter", context)
+    manager = AsyncManager("manager", context, [timer, sensor, counter], "timer")
+
+    async def interrupt():
+        task = asyncio.create_task(manager.main())
+        await asyncio.sleep(1)
+        task.cancel()
+        await task
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(interrupt())
+    context.term()
+    assert counter.count > 0
+    assert sensor.get_state() == "closing"
@@ -0,0 +1,214 @@
+"""
+Test facility for the loader.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import math
+import threading
+import time
+
+import pytest
+import zmq
+
+from rethebes.instrulib import Instrument
+from rethebes.instruments import Loader, Manager
+from rethebes.instruments.loader import loader as loader_module
+from rethebes.instruments.loader.kernels import create_kernel, known_kernels
+from rethebes.instruments.loader.steady import SteadyStateDetector
+from rethebes.run import process_configuration
+from rethebes.topology import Core
+
+
+class Listener(Instrument):
+    def __init__(self, name, context):
+        self.events = []
+        super().__init__(name, context)
+        self.subscribed_headers = ["loader-event"]
+
+    def get_timeout(self):
+        return None
+
+    def process_relayed_message(self, message):
+        if message["body"]["command"] != "ready":
+            self.events.append((message["body"]["command"], time.time()))
+
+
+class Closer(Instrument):
+    # Raises a critical event after a delay, like the watchdog
+    def __init__(self, name, context, delay):
+        self.delay = delay
+        self.start_time = None
+        super().__init__(name, context)
+
+    def get_timeout(self):
+        if self.start_time is None:
+            self.start_time = time.time()
+        return max(0, self.start_time + self.delay - time.time())
+
+    def run(self):
+        self.send_event(command="critical", description="Test", sample_time=time.time())
+        self.set_state("waiting")
+
+
+class PeriodSampler(threading.Thread):
+    # Reads the actuation periods counted by the workers of a loader while it runs
+    def __init__(self, loader):
+        super().__init__()
+        self.loader = loader
+        self.samples = []
+        self.done = False
+
+    def run(self):
+        while not self.done:
+            counters = getattr(self.loader, "counters", dict())
+            periods = sum(c[2] for c in list(counters.values()))
+            self.samples.append((time.time(), periods))
+            time.sleep(0.01)
+
+
+@pytest.mark.parametrize("measurement", ["inline", "monitor"])
+def test_seamless_steps(measurement):
+    load = {
+        "target_cores": 1,
+        "target_loads": 20,
+        "sampling_interval": 0.1,
+        "measurement": measurement,
+    }
+    configuration = process_configuration(
+        {
+            "instruments": ["loader"],
+            "loader": [dict(load, duration=0.5), dict(load, duration=0.5)],
+        }
+    )
+    context = zmq.Context(0)
+    loader = Loader("loader", context, configuration["loader"])
+    listener = Listener("listener", context)
+    manager = Manager("manager", context, [loader, listener], "loader")
+    sampler = PeriodSampler(loader)
+    sampler.start()
+    manager.main()
+    sampler.done = True
+    sampler.join()
+    context.term()
+    commands = [c for c, t in listener.events]
+    assert commands == ["start", "stop", "start", "stop", "finish"]
+    times = [t for c, t in listener.events]
+    # The next step starts right after the previous one, with the same workers,
+    assert times[2] - times[1] < 0.05
+    # and keep actuating across the boundary, one period every 0.05 s
+    changes = [
+        t
+        for (t, p), (_, q) in zip(sampler.samples, sampler.samples[1:])
+        if q > p and times[0] + 0.1 < t < times[4] - 0.1
+    ]
+    assert any(t < times[1] for t in changes) and any(t > times[2] for t in changes)
+    assert max(b - a for a, b in zip(changes, changes[1:])) < 0.2
+    assert 0.9 < times[4] - times[0] < 1.2
+    assert all(not w.is_alive() for w in loader.workers)
+    assert len(loader.tracking) == 2
+    if measurement == "inline":
+        # The inline controller converges within a few actuation periods
+        step, achieved, error = loader.tracking[1]
+        assert step == 2
+        assert abs(achieved - 0.2) < 0.05
+        assert error < 0.1
+
+
+@pytest.mark.parametrize("name", known_kernels)
+def test_kernel_chunks(name):
+    kernel = create_kernel(name)
+    start = time.perf_counter()
+    for i in range(100):
+        kernel.run()
+    # Chunks are short compared to the actuation period
+    assert (time.perf_counter() - start) / 100 < 1e-3
+
+
+def test_steady_state_detector():
+    detector = SteadyStateDetector(100, window=2, slope=0.1, hold=1, min_duration=0)
+    # Exponential approach to 60 °C with a time constant of 1 s, sampled every 0.1 s
+    settled = None
+    for i in range(200):
+        t = 100 + i / 10
+        if detector.update(t, 60 - 30 * math.exp(-(t - 100))):
+            settled = t - 100
+            break
+    # The fitted slope is that of the window, which lags the instantaneous one
+    assert detector.get_settling_time() is not None
+    assert 3 < detector.get_settling_time() < 7
+    assert settled == pytest.approx(detector.get_settling_time() + 1)
+    regression = detector.regression
+    assert regression.n == 21  # Only the samples in the window are kept
+    assert regression.get_deviation() < 0.1
+
+
+@pytest.mark.parametrize("measurement", ["inline", "monitor"])
+def test_shutdown_latency(measurement):
+    # An infinite step at full load stops within a few actuation periods
+    configuration = process_configuration(
+        {
+            "instruments": ["loader"],
+            "loader": [
+                {
+                    "target_cores": "all",
+                    "target_loads": 100,
+                    "duration": -1,
+                    "measurement": measurement,
+                }
+            ],
+        }
+    )
+    context = zmq.Context(0)
+    loader = Loader("loader", context, configuration["loader"])
+    closer = Closer("closer", context, 1)
+    manager = Manager("manager", context, [loader, closer], "loader")
+    manager.main()
+    context.term()
+    assert loader.stop_latency < 0.2
+
+
+def test_close_after_workers_ended():
+    # On CTRL+C, workers may end before the loader closes
+    configuration = process_configuration({"instruments": ["loader"]})
+    context = zmq.Context(0)
+    loader = Loader("loader", context, configuration["loader"])
+    loader.open()
+    for worker in loader.workers:
+        worker.terminate()
+        worker.join()
+    loader.close()
+    context.term()
+
+
+@pytest.mark.parametrize(
+    "target_cores", [0, 1000, [1, 1000], {"socket": 0}, {"package": 1000}, "one"]
+)
+def test_invalid_cores(target_cores):
+    # An invalid selection is a critical error, which ends the run before any load
+    configuration = process_configuration(
+        {"instruments": ["loader"], "loader": [{"target_cores": target_cores}]}
+    )
+    context = zmq.Context(0)
+    loader = Loader("loader", context, configuration["loader"])
+    manager = Manager("manager", context, [loader], "loader")
+    manager.main()
+    context.term()
+    assert loader.step_number == 0
+
+
+def test_worker_fails_to_start(monkeypatch):
+    # A worker bound to a CPU that does not exist cannot start, which is a critical error
+    monkeypatch.setattr(
+        loader_module, "discover_topology", lambda: [Core(1, [0]), Core(2, [4095])]
+    )
+    monkeypatch.setattr(loader_module, "available_cpus", lambda cores: {0, 4095})
+    configuration = process_configuration({"instruments": ["loader"]})
+    context = zmq.Context(0)
+    loader = Loader("loader", context, configuration["loader"])
+    manager = Manager("manager", context, [loader], "loader")
+    manager.main()
+    context.term()
+    assert loader.step_number == 0
+    assert all(not w.is_alive() for w in loader.workers)
@@ -0,0 +1,60 @@
+"""
+Test facility for load profiles.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import pytest
+
+from rethebes.profiles import LoadCommand, create_profile
+
+
+def test_profiles(tmp_path):
+    ramp = create_profile({"type": "ramp", "start": 0, "end": 100}, 10)
+    assert ramp.value(5) == 50
+    assert ramp.value(20) == 100
+    sine = create_profile({"type": "sine", "mean": 50, "amplitude": 80, "period": 4})
+    assert sine.value(1) == 100  # Clipped
+    assert sine.value(2) == pytest.approx(50)
+    square = create_profile(
+        {"type": "square", "low": 10, "high": 90, "period": 2, "duty": 0.25}
+    )
+    assert [square.value(t) for t in [0, 0.6, 2.1]] == [90, 10, 90]
+    path = tmp_path / "profile.csv"
+    path.write_text("Time,Load\n0,0\n10,50\n")
+    csv = create_profile({"type": "csv", "file_name": str(path)})
+    assert csv.value(4) == 20
+    assert csv.value(30) == 50
+    with pytest.raises(ValueError):
+        create_profile({"type": "triangle"})
+
+
+def test_prbs():
+    prbs = create_profile(
+        {"type": "prbs", "low": 0, "high": 100, "bit_duration": 1, "order": 5}
+    )
+    bits = [prbs.value(t + 0.5) for t in range(31)]
+    # A maximal length sequence has one more high bit than low bits, and then repeats
+    assert bits.count(100) == 16
+    assert prbs.value(31.5) == bits[0]
+
+
+def test_load_command():
+    command = LoadCommand(2)
+    profile = {"type": "ramp", "start": 0, "end": 100}
+    command.process_load_event(
+        {
+            "command": "start",
+            "target_cores": [2],
+            "target_loads": [0],
+            "duration": 10,
+            "profile": profile,
+            "start_time": 1000,
+        }
+    )
+    assert command.get_loads(1002) == [0, 20]
+    command.process_load_event(
+        {"command": "stop", "target_cores": [2], "target_loads": [0]}
+    )
+    assert command.get_loads(1002) == [0, 0]
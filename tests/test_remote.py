@@ -0,0 +1,200 @@
+"""
+Test facility for instruments hosted by an agent in another process.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import datetime
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pandas as pd
+import pytest
+import zmq
+
+from rethebes.instrulib import Instrument, RemoteInstrument, estimate_offset, remote
+from rethebes.instruments import Manager, Timer
+from rethebes.run import process_configuration
+
+
+class Recorder(Instrument):
+    def __init__(self, name, context):
+        self.times = []
+        super().__init__(name, context)
+        self.data_subscription = {"headers": ["sensor-data"]}
+
+    def get_timeout(self):
+        return None
+
+    def process_data_message(self, message):
+        self.times.append(datetime.datetime.fromisoformat(message["body"]["Time"]))
+
+
+def start_agent():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    address = "tcp://127.0.0.1:" + str(port)
+    process = subprocess.Popen([sys.executable, "-m", "rethebes", "agent", address])
+    return address, process
+
+
+@pytest.fixture
+def agent():
+    address, process = start_agent()
+    yield address
+    process.terminate()
+    process.wait()
+
+
+def test_estimate_offset():
+    # The remote clock is 1000 ns ahead, the second exchange has the shortest round trip
+    samples = [(0, 1500, 1600, 700), (1000, 2050, 2060, 1120), (2000, 3300, 3310, 2500)]
+    offset, delay = estimate_offset(samples)
+    assert delay == 110
+    assert abs(offset - 1000) <= delay / 2
+
+
+@pytest.mark.parametrize("codec", ["json", "frame"])
+def test_remote_sensor(agent, codec, tmp_path):
+    path = tmp_path / "remote.csv"
+    configuration = process_configuration(
+        {
+            "instruments": ["timer", "sensor"],
+            "timer": {"duration": 2},
+            "sensor": {
+                "sampling_interval": 0.1,
+                "backend": "synthetic",
+                "file_name": path,
+            },
+        }
+    )
+    context = zmq.Context(1)
+    sensor = RemoteInstrument(
+        "sensor", context, agent, "sensor", configuration["sensor"]
+    )
+    recorder = Recorder("recorder", context)
+    instruments = [Timer("timer", context, configuration["timer"]), sensor, recorder]
+    manager = Manager("manager", context, instruments, "timer", codec)
+    manager.main()
+    context.term()
+    # Both processes use the same clock
+    assert abs(sensor.offset_ns) < 5e6
+    # Data is written by the agent and published to local subscribers
+    data = pd.read_csv(path)
+    assert len(data) > 10
+    assert len(recorder.times) >= len(data) - 1
+    assert sensor.cpu_time_ns > 0
+
+
+def test_remote_sensor_offset(agent, tmp_path, monkeypatch):
+    # Pretend that the clock of the agent is one hour ahead
+    hour = datetime.timedelta(hours=1)
+    monkeypatch.setattr(
+        remote, "estimate_offset", lambda samples: (hour.total_seconds() * 1e9, 0)
+    )
+    path = tmp_path / "remote.csv"
+    configuration = process_configuration(
+        {
+            "instruments": ["timer", "sensor"],
+            "timer": {"duration": 1},
+            "sensor": {"backend": "synthetic", "file_name": path},
+        }
+    )
+    context = zmq.Context(1)
+    sensor = RemoteInstrument(
+        "sensor", context, agent, "sensor", configuration["sensor"]
+    )
+    recorder = Recorder("recorder", context)
+    instruments = [Timer("timer", context, configuration["timer"]), sensor, recorder]
+    manager = Manager("manager", context, instruments, "timer", "json")
+    start = datetime.datetime.now()
+    manager.main()
+    context.term()
+    # Both the file and the published rows are shifted back by the offset
+    data = pd.read_csv(path, parse_dates=["Time"])
+    assert abs(data["Time"].iloc[0] - (start - hour)) < datetime.timedelta(seconds=5)
+    assert abs(recorder.times[0] - (start - hour)) < datetime.timedelta(seconds=5)
+
+
+def test_unreachable_agent(monkeypatch):
+    monkeypatch.setattr(remote, "request_timeout", 0.5)
+    context = zmq.Context(1)
+    sensor = RemoteInstrument("sensor", context, "tcp://127.0.0.1:1", "sensor", {})
+    with pytest.raises(ConnectionError):
+        sensor.deploy()
+    context.term()
+
+
+def test_agent_error(agent):
+    context = zmq.Context(1)
+    sensor = RemoteInstrument("sensor", context, agent, "unknown", {})
+    with pytest.raises(ValueError, match="Unknown instrument: unknown"):
+        sensor.deploy()
+    # The agent keeps serving after a bad request
+    sensor.request.send_string("not json")
+    assert "error" in sensor.request.recv_json()
+    sensor.ask(command="ping")
+    sensor.request.close()
+    context.term()
+
+
+def test_agent_dies(monkeypatch):
+    # The director gives up on the instrument shortly after closure
+    monkeypatch.setattr(remote, "join_timeout", 0.5)
+    address, process = start_agent()
+    configuration = process_configuration(
+        {
+            "instruments": ["timer", "sensor"],
+            "timer": {"duration": 2},
+            "sensor": {"backend": "synthetic", "write": False},
+        }
+    )
+    context = zmq.Context(1)
+    sensor = RemoteInstrument(
+        "sensor", context, address, "sensor", configuration["sensor"]
+    )
+    instruments = [Timer("timer", context, configuration["timer"]), sensor]
+    manager = Manager("manager", context, instruments, "timer")
+
+    def kill():
+        # Once the instrument runs on the agent
+        while not manager.ready.get("sensor"):
+            time.sleep(0.01)
+        process.kill()
+
+    threading.Thread(target=kill).start()
+    start = time.time()
+    manager.main()
+    context.term()
+    process.wait()
+    assert time.time() - start < 5
+    assert not hasattr(sensor, "cpu_time_ns")
+
+
+@pytest.mark.parametrize(
+    "instrument, settings",
+    [
+        ("loader", [{"until": "steady"}]),
+        ("loader", [{"target_temperature": 50}]),
+        ("watchdog", {}),
+    ],
+)
+def test_remote_subscribers(instrument, settings):
+    # Remote instruments cannot receive data
+    with pytest.raises(ValueError):
+        process_configuration(
+            {
+                "instruments": [instrument, "sensor"],
+                instrument: settings,
+                "remote": {instrument: "tcp://127.0.0.1:5555"},
+            }
+        )
+    configuration = process_configuration(
+        {"instruments": ["sensor"], "remote": {"sensor": "tcp://127.0.0.1:5555"}}
+    )
+    assert not configuration["sensor"]["record_telemetry"]
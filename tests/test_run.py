@@ -6,11 +6,18 @@ License: See project-level license file.
 """
 
 import logging
+import shutil
 import time
 from pathlib import Path
 
+import pandas as pd
 import pytest
 
+from rethebes.analysis.util import (
+    check_if_data_complete,
+    get_number_of_cores,
+    read_data_from_file,
+)
 from rethebes.run import default_configuration, process_configuration, run
 
 
@@ -88,6 +95,159 @@ def test_write():
     path.unlink()  # Clean up
 
 
+def test_write_columnar():
+    configuration = {
+        "instruments": ["timer", "sensor"],
+        "sensor": {
+            "sampling_interval": 0.1,
+            "accept_incomplete_data": True,
+            "write": True,
+            "file_name": "test_write_columnar.columns",
+            "output_format": "columnar",
+            "output_dtype": "float32",
+        },
+        "timer": {"duration": 1},
+    }
+    run(configuration)
+    path = Path.cwd() / configuration["sensor"]["file_name"]
+    data = read_data_from_file(path, ["Load CPU Total"])
+    shutil.rmtree(path)  # Clean up
+    assert list(data.columns) == ["Time", "Load CPU Total"]
+    assert len(data) > 5
+    assert data["Load CPU Total"].dtype == "float32"
+    assert (data["Time"].diff().dropna() > pd.Timedelta(0)).all()
+
+
+def test_process_acquisition():
+    configuration = {
+        "instruments": ["timer", "sensor"],
+        "sensor": {
+            "sampling_interval": 0.1,
+            "acquisition": "process",
+            "accept_incomplete_data": True,
+            "write": True,
+            "file_name": "test_process_acquisition.csv",
+        },
+        "timer": {"duration": 1},
+    }
+    run(configuration)
+    path = Path.cwd() / configuration["sensor"]["file_name"]
+    with open(path) as f:
+        lines = f.readlines()
+    path.unlink()  # Clean up
+    assert lines[0].startswith("Time,")
+    assert len(lines) > 5
+
+
+def test_replay():
+    path = Path.cwd() / "test_replay.csv"
+    with open(path, "w") as f:
+        f.write("Time,Temperature CPU Package,Load CPU Total\n")
+        for i in range(21):
+            f.write("2024-01-01T00:00:" + f"{i * 0.1:06.3f}" + ",50," + str(i) + "\n")
+    # 2 seconds of data
+    configuration = {
+        "instruments": ["replay"],
+        "replay": {"file_name": str(path), "speed": 4},
+    }
+    start = time.time()
+    run(configuration)
+    replay_time = time.time() - start
+    configuration["replay"]["speed"] = 0  # As fast as possible
+    start = time.time()
+    run(configuration)
+    fast_replay_time = time.time() - start
+    path.unlink()  # Clean up
+    assert 0.5 <= replay_time < 1.5
+    assert fast_replay_time < replay_time
+
+
+@pytest.mark.parametrize("acquisition", ["thread", "process"])
+def test_synthetic_backend(acquisition):
+    configuration = {
+        "instruments": ["loader", "sensor"],
+        "loader": [
+            {
+                "target_cores": 1,
+                "target_loads": 100,
+                "duration": 1.5,
+                "sampling_interval": 0.1,
+            }
+        ],
+        "sensor": {
+            "sampling_interval": 0.1,
+            "acquisition": acquisition,
+            "backend": "synthetic",
+            "synthetic": {"cores": 2, "time_constant": 0.5},
+            "write": True,
+            "file_name": "test_synthetic_backend.csv",
+        },
+    }
+    run(configuration)
+    path = Path.cwd() / configuration["sensor"]["file_name"]
+    data = read_data_from_file(path)
+    path.unlink()  # Clean up
+    assert check_if_data_complete(data)
+    assert get_number_of_cores(data) == 2
+    assert data["Load CPU Core #1 Thread #1"].max() == 100
+    assert data["Load CPU Core #2 Thread #1"].max() == 0
+    # Only the loaded core heats up
+    assert data["Temperature CPU Core #1"].max() > 60
+    assert data["Temperature CPU Core #2"].max() < 35
+
+
+@pytest.mark.parametrize("acquisition", ["thread", "process"])
+def test_adaptive_sampling(acquisition):
+    load = {"target_cores": 1, "target_loads": 0, "sampling_interval": 0.1}
+    configuration = {
+        "instruments": ["loader", "sensor"],
+        "loader": [dict(load, duration=1.5), dict(load, duration=1.5)],
+        "sensor": {
+            "sampling_interval": 0.05,
+            "acquisition": acquisition,
+            "backend": "synthetic",
+            "adaptive_sampling": True,
+            "slow_sampling_interval": 0.5,
+            "transient_duration": 0.3,
+            "temperature_rate_threshold": 1000,  # Only loader events trigger
+            "write": True,
+            "file_name": "test_adaptive_sampling.csv",
+        },
+    }
+    run(configuration)
+    path = Path.cwd() / configuration["sensor"]["file_name"]
+    data = read_data_from_file(path)
+    path.unlink()  # Clean up
+    intervals = data["Time"].diff().dropna().dt.total_seconds()
+    assert intervals.min() < 0.1
+    assert intervals.max() > 0.4
+    # Much fewer samples than with the fast interval only
+    assert len(data) < 40
+
+
+def test_frame_codec():
+    configuration = {
+        "instruments": ["loader", "sensor"],
+        "codec": "frame",
+        "loader": [
+            {
+                "target_cores": 1,
+                "target_loads": 0,
+                "duration": 1,
+                "sampling_interval": 0.1,
+            }
+        ],
+        "sensor": {
+            "sampling_interval": 0.1,
+            "backend": "synthetic",
+            "write": False,
+        },
+    }
+    start = time.time()
+    run(configuration)
+    assert time.time() - start < 5
+
+
 def test_process_configuration():
     configuration = {"instruments": "auto"}
     configuration = process_configuration(configuration)
@@ -129,3 +289,136 @@ def test_process_configuration():
                 configuration["loader"][0][k] == default_configuration["loader"][0][k]
             )
     assert configuration["loader"][0]["duration"] == 1
+
+
+def test_profile_command():
+    configuration = {
+        "instruments": ["loader", "sensor"],
+        "loader": [
+            {
+                "target_cores": 1,
+                "duration": 2,
+                "profile": {"type": "ramp", "start": 0, "end": 100},
+            }
+        ],
+        "sensor": {
+            "sampling_interval": 0.1,
+            "backend": "synthetic",
+            "synthetic": {"cores": 2},
+            "write": True,
+            "file_name": "test_profile_command.csv",
+        },
+    }
+    run(configuration)
+    path = Path.cwd() / configuration["sensor"]["file_name"]
+    data = read_data_from_file(path)
+    path.unlink()  # Clean up
+    # The command is recorded, and the synthetic load follows it
+    command = data["Command CPU Core #1"]
+    assert command[command > 0].is_monotonic_increasing
+    assert 0 <= command.min() < 20
+    assert 80 < command.max() <= 100
+    assert (data["Load CPU Core #1 Thread #1"] - command).abs().max() < 0.1
+    assert data["Command CPU Core #2"].max() == 0
+
+
+def test_steady_state_steps():
+    load = {
+        "target_cores": "all",
+        "duration": 20,
+        "until": "steady",
+        "steady_window": 1,
+        "steady_slope": 0.5,
+        "steady_hold": 0.5,
+    }
+    configuration = {
+        "instruments": ["loader", "sensor"],
+        "loader": [dict(load, target_loads=0), dict(load, target_loads=50)],
+        "sensor": {
+            "sampling_interval": 0.05,
+            "backend": "synthetic",
+            "synthetic": {"cores": 2, "time_constant": 0.5},
+            "write": True,
+            "file_name": "test_steady_state_steps.csv",
+        },
+    }
+    start = time.time()
+    run(configuration)
+    elapsed = time.time() - start
+    path = Path.cwd() / configuration["sensor"]["file_name"]
+    data = read_data_from_file(path)
+    path.unlink()  # Clean up
+    # Both steps end well before their maximum duration, and their settling time is recorded
+    assert elapsed < 20
+    # The settling time of each step is recorded while its temperature is steady
+    settling_times = data["Settling Time"].dropna()
+    assert settling_times.nunique() >= 2
+    assert settling_times.max() < 10
+
+
+def test_target_temperature():
+    configuration = {
+        "instruments": ["loader", "sensor"],
+        "loader": [
+            {
+                "target_cores": "all",
+                "target_loads": 0,
+                "duration": 6,
+                "target_temperature": 50,
+                "temperature_ki": 0.05,
+            }
+        ],
+        "sensor": {
+            "sampling_interval": 0.05,
+            "backend": "synthetic",
+            "synthetic": {"cores": 2, "time_constant": 0.5},
+            "write": True,
+            "file_name": "test_target_temperature.csv",
+        },
+    }
+    run(configuration)
+    path = Path.cwd() / configuration["sensor"]["file_name"]
+    data = read_data_from_file(path)
+    path.unlink()  # Clean up
+    # The load that holds the temperature is recorded as the command,
+    # which is 0 in the rows sampled after the end of the step
+    end = data[data["Command CPU Core #1"] > 0].iloc[-20:]
+    assert (end["Temperature CPU Package"] - 50).abs().max() < 0.5
+    assert 20 < end["Command CPU Core #1"].mean() < 80
+    assert (
+        end["Load CPU Core #1 Thread #1"] - end["Command CPU Core #1"]
+    ).abs().max() < 1
+
+
+@pytest.mark.parametrize("acquisition", ["thread", "process"])
+def test_worker_telemetry(acquisition):
+    configuration = {
+        "instruments": ["loader", "sensor"],
+        "loader": [
+            {
+                "target_cores": 1,
+                "target_loads": 50,
+                "duration": 2,
+                "telemetry_interval": 0.2,
+            }
+        ],
+        "sensor": {
+            "sampling_interval": 0.1,
+            "backend": "synthetic",
+            "synthetic": {"cores": 2},
+            "acquisition": acquisition,
+            "write": True,
+            "file_name": "test_worker_telemetry.csv",
+        },
+    }
+    run(configuration)
+    path = Path.cwd() / configuration["sensor"]["file_name"]
+    data = read_data_from_file(path)
+    path.unlink()  # Clean up
+    # The telemetry of the worker of the first logical CPU is merged with the measurements
+    end = data.iloc[-10:]
+    assert (end["Worker Load CPU Core #1 Thread #1"] - 50).abs().max() < 25
+    assert (end["Worker Sleep CPU Core #1 Thread #1"] > 0).all()
+    assert (end["Worker Throughput CPU Core #1 Thread #1"] > 0).all()
+    # Other CPUs have no worker, or an idle one
+    assert data["Worker Throughput CPU Core #2 Thread #1"].fillna(0).max() == 0
@@ -0,0 +1,231 @@
+"""
+Test facility for the sensor, its backends and its output stages.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import datetime
+import os
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+import pytest
+import zmq
+
+from rethebes.analysis.util import read_data_from_file
+from rethebes.instruments import Manager, Sensor, Timer
+from rethebes.instruments.sensor.aggregator import Aggregator
+from rethebes.instruments.sensor.cpu import CPU
+from rethebes.instruments.sensor.linux import LinuxBackend
+from rethebes.instruments.sensor.writer import BatchedWriter
+from rethebes.run import process_configuration
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def make_linux_tree(root):
+    # Two physical cores with two threads each, numbered as N and N + physical
+    for cpu, core in [(0, 0), (1, 4), (2, 0), (3, 4)]:
+        cpu_dir = root / "sys/devices/system/cpu" / ("cpu" + str(cpu))
+        write(cpu_dir / "topology/physical_package_id", "0\n")
+        write(cpu_dir / "topology/core_id", str(core) + "\n")
+        write(cpu_dir / "cpufreq/scaling_cur_freq", str(3000000 + cpu) + "\n")
+    hwmon = root / "sys/class/hwmon/hwmon2"
+    write(hwmon / "name", "coretemp\n")
+    write(hwmon / "temp1_label", "Package id 0\n")
+    write(hwmon / "temp1_input", "55000\n")
+    write(hwmon / "temp2_label", "Core 0\n")
+    write(hwmon / "temp2_input", "50000\n")
+    write(hwmon / "temp2_crit", "100000\n")
+    write(hwmon / "temp3_label", "Core 4\n")
+    write(hwmon / "temp3_input", "54000\n")
+    write(hwmon / "temp3_crit", "100000\n")
+    rapl = root / "sys/class/powercap/intel-rapl:0"
+    write(rapl / "name", "package-0\n")
+    write(rapl / "energy_uj", "1000000\n")
+    write(rapl / "max_energy_range_uj", "262143328850\n")
+    write_stat(root, 0)
+
+
+def write_stat(root, busy):
+    # Half of the time elapsed since the previous write is busy
+    total = str(100 + 4 * busy) + " 0 0 " + str(400 + 4 * busy)
+    lines = ["cpu  " + total + " 0 0 0 0 0 0"]
+    for cpu in range(4):
+        times = str(25 + busy) + " 0 0 " + str(100 + busy)
+        lines.append("cpu" + str(cpu) + " " + times + " 0 0 0 0 0 0")
+    lines.append("intr 0")
+    write(root / "proc/stat", "\n".join(lines) + "\n")
+
+
+def test_linux_backend(tmp_path):
+    make_linux_tree(tmp_path)
+    backend = LinuxBackend(tmp_path)
+    backend.open()
+    cpu = CPU(backend)
+    write_stat(tmp_path, 100)
+    (tmp_path / "sys/class/powercap/intel-rapl:0/energy_uj").write_text("2000000\n")
+    values = dict(zip(cpu.names, cpu.read()))
+    backend.close()
+
+    assert values["Temperature CPU Package"] == 55
+    assert values["Temperature CPU Core #1"] == 50
+    assert values["Temperature CPU Core #2"] == 54
+    assert values["Temperature CPU Core #2 Distance to TjMax"] == 46
+    assert values["Temperature Core Max"] == 54
+    assert values["Temperature Core Average"] == 52
+    # Threads of core #2 are logical CPUs 1 and 3
+    assert values["Load CPU Core #2 Thread #2"] == 50
+    assert values["Load CPU Total"] == 50
+    assert values["Clock CPU Core #2"] == 3000.001
+    assert values["Power CPU Package"] > 0
+    assert values["Power CPU Cores"] is None
+    assert values["Voltage CPU Core #1"] is None
+
+
+def test_subscriptions(tmp_path):
+    make_linux_tree(tmp_path)
+    backend = LinuxBackend(tmp_path)
+    backend.open()
+    subscriptions = {
+        "Temperature": {"include": ["CPU*"], "exclude": ["*Distance to TjMax"]},
+        "Clock": {},
+    }
+    cpu = CPU(backend, subscriptions)
+    values = cpu.read()
+    backend.close()
+
+    assert cpu.names == [
+        "Temperature CPU Core #1",
+        "Temperature CPU Core #2",
+        "Temperature CPU Package",
+        "Clock CPU Core #1",
+        "Clock CPU Core #2",
+    ]
+    assert values == [50, 54, 55, 3000, 3000.001]
+
+
+def test_aggregator():
+    aggregator = Aggregator(["Time", "A", "B"], 1)
+    start = datetime.datetime(2024, 1, 1)
+    rows = []
+    for i in range(25):  # Samples every 0.1 s for 2.5 s
+        time = start + datetime.timedelta(seconds=0.1 * i)
+        row = aggregator.add([time, float(i), None if i % 2 else 1.0])
+        if row is not None:
+            rows.append(row)
+    rows.append(aggregator.finish())
+    assert aggregator.finish() is None
+    assert aggregator.columns == ["Time", "A", "B", "A Min", "B Min"] + [
+        "A Max",
+        "B Max",
+        "A Last",
+        "B Last",
+    ]
+    assert [row[0] for row in rows] == [
+        start + datetime.timedelta(seconds=s) for s in range(3)
+    ]
+    assert rows[0][1:] == [4.5, 1.0, 0.0, 1.0, 9.0, 1.0, 9.0, 1.0]
+    assert rows[2][1:] == [22.0, 1.0, 20.0, 1.0, 24.0, 1.0, 24.0, 1.0]
+
+
+def test_acquisition_process_interrupted(tmp_path):
+    # Like CTRL+C, which reaches the acquisition process, that ends without reporting
+    configuration = process_configuration(
+        {
+            "instruments": ["timer", "sensor"],
+            "timer": {"duration": 5},
+            "sensor": {
+                "sampling_interval": 0.05,
+                "backend": "synthetic",
+                "acquisition": "process",
+                "file_name": tmp_path / "interrupted.csv",
+            },
+        }
+    )
+    context = zmq.Context(0)
+    sensor = Sensor("sensor", context, configuration["sensor"])
+    timer = Timer("timer", context, configuration["timer"])
+
+    def interrupt():
+        while getattr(sensor, "ring", None) is None:
+            time.sleep(0.05)
+        time.sleep(0.5)  # Sampling
+        os.kill(sensor.process.pid, signal.SIGINT)
+
+    interrupter = threading.Thread(target=interrupt)
+    interrupter.start()
+    Manager("manager", context, [timer, sensor], "timer").main()
+    interrupter.join()
+    context.term()
+    # The rows sampled before the interruption are saved, and the shared memory is released
+    data = read_data_from_file(tmp_path / "interrupted.csv")
+    assert len(data) > 5
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(sensor.ring.name)
+
+
+def wait_for_rows(writer, rows, timeout=2):
+    deadline = time.monotonic() + timeout
+    while writer.rows_written < rows and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return writer.rows_written
+
+
+def make_rows(count):
+    start = datetime.datetime(2024, 1, 1)
+    return [[start + datetime.timedelta(seconds=i), float(i)] for i in range(count)]
+
+
+def test_writer_flush_rows(tmp_path):
+    writer = BatchedWriter(tmp_path / "rows.csv", ["Time", "A"], 3, 100)
+    writer.start()
+    for row in make_rows(5):
+        writer.write(row)
+    # A full block is written at once, the rest waits for the interval or the closure
+    assert wait_for_rows(writer, 3) == 3
+    time.sleep(0.1)
+    assert writer.rows_written == 3
+    writer.close()
+    assert writer.rows_written == 5
+    assert writer.error is None
+    assert len(read_data_from_file(tmp_path / "rows.csv")) == 5
+
+
+def test_writer_flush_interval(tmp_path):
+    writer = BatchedWriter(tmp_path / "interval.csv", ["Time", "A"], 1000, 0.2)
+    writer.start()
+    for row in make_rows(2):
+        writer.write(row)
+    assert writer.rows_written == 0
+    assert wait_for_rows(writer, 2) == 2
+    writer.close()
+
+
+@pytest.mark.parametrize("fsync", [False, True])
+def test_writer_fsync(tmp_path, monkeypatch, fsync):
+    calls = []
+    monkeypatch.setattr(os, "fsync", calls.append)
+    writer = BatchedWriter(tmp_path / "fsync.csv", ["Time", "A"], 2, 100, fsync)
+    writer.start()
+    for row in make_rows(4):
+        writer.write(row)
+    writer.close()
+    # One fsync per block
+    assert len(calls) == (2 if fsync else 0)
+
+
+def test_writer_error(tmp_path):
+    writer = BatchedWriter(tmp_path / "missing" / "error.csv", ["Time", "A"])
+    writer.start()
+    for row in make_rows(2):
+        writer.write(row)
+    writer.close()
+    assert isinstance(writer.error, FileNotFoundError)
+    assert writer.rows_written == 0
@@ -0,0 +1,72 @@
+"""
+Test facility for the discovery of the topology of the CPU.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import psutil
+import pytest
+
+from rethebes.topology import (
+    discover_topology,
+    infer_topology,
+    restrict_topology,
+    select_cores,
+)
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def make_hybrid_tree(root):
+    # Two performance cores with two threads numbered as N and N + 2, then two efficiency cores,
+    # on two NUMA nodes
+    for cpu, core, node in [
+        (0, 0, 0),
+        (1, 4, 0),
+        (2, 0, 0),
+        (3, 4, 0),
+        (4, 8, 1),
+        (5, 9, 1),
+    ]:
+        cpu_dir = root / "sys/devices/system/cpu" / ("cpu" + str(cpu))
+        write(cpu_dir / "topology/physical_package_id", "0\n")
+        write(cpu_dir / "topology/core_id", str(core) + "\n")
+        (cpu_dir / ("node" + str(node))).mkdir()
+    write(root / "sys/devices/cpu_core/cpus", "0-3\n")
+    write(root / "sys/devices/cpu_atom/cpus", "4-5\n")
+
+
+def test_linux_topology(tmp_path):
+    make_hybrid_tree(tmp_path)
+    cores = discover_topology(tmp_path)
+    assert [c.cpus for c in cores] == [[0, 2], [1, 3], [4], [5]]
+    assert [c.core_type for c in cores] == ["performance"] * 2 + ["efficiency"] * 2
+    assert select_cores(cores, "all") == [1, 2, 3, 4]
+    assert select_cores(cores, 2) == [2]
+    assert select_cores(cores, {"type": "efficiency"}) == [3, 4]
+    assert select_cores(cores, {"node": 0, "core_id": [4, 8]}) == [2]
+    with pytest.raises(ValueError):
+        select_cores(cores, {"node": 2})
+
+
+def test_inferred_topology(monkeypatch):
+    # A hybrid processor with 6 performance and 8 efficiency cores
+    monkeypatch.setattr(psutil, "cpu_count", lambda logical=True: 20 if logical else 14)
+    cores = infer_topology()
+    assert len(cores) == 14
+    assert cores[5].cpus == [10, 11]
+    assert cores[6].cpus == [12]
+    assert select_cores(cores, {"type": "performance"}) == [1, 2, 3, 4, 5, 6]
+
+
+def test_restricted_topology(tmp_path):
+    # Like under taskset -c 0,4
+    make_hybrid_tree(tmp_path)
+    cores = restrict_topology(discover_topology(tmp_path), {0, 4})
+    assert [c.number for c in cores] == [1, 3]
+    assert [c.cpus for c in cores] == [[0], [4]]
+    assert select_cores(cores, "all") == [1, 3]
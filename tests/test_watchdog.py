@@ -0,0 +1,116 @@
+"""
+Test facility for the watchdog.
+
+Authors: Giulio Foletto.
+License: See project-level license file.
+"""
+
+import datetime
+import time
+
+import pytest
+import zmq
+
+from rethebes.instruments import Loader, Manager, Sensor, Timer, Watchdog
+from rethebes.run import process_configuration
+
+
+def test_overheating():
+    configuration = process_configuration(
+        {
+            "instruments": ["loader", "sensor", "watchdog"],
+            "loader": [{"target_cores": "all", "target_loads": 100, "duration": 20}],
+            "sensor": {
+                "sampling_interval": 0.05,
+                "backend": "synthetic",
+                "synthetic": {"cores": 2, "time_constant": 1},
+                "write": False,
+            },
+            "watchdog": {"max_temperature": 50},
+        }
+    )
+    context = zmq.Context(0)
+    loader = Loader("loader", context, configuration["loader"])
+    instruments = [
+        loader,
+        Sensor("sensor", context, configuration["sensor"]),
+        Watchdog("watchdog", context, configuration["watchdog"]),
+    ]
+    start = time.time()
+    Manager("manager", context, instruments, "loader").main()
+    context.term()
+    # The load stops right after the first sample above the limit
+    assert time.time() - start < 10
+    assert loader.stop_latency is not None
+    assert loader.stop_latency < 0.2
+
+
+def test_stale_sensor():
+    configuration = process_configuration(
+        {
+            "instruments": ["timer", "watchdog"],
+            "timer": {"duration": 10},
+            "watchdog": {"stale_timeout": 0.5},
+        }
+    )
+    context = zmq.Context(0)
+    instruments = [
+        Timer("timer", context, configuration["timer"]),
+        Watchdog("watchdog", context, configuration["watchdog"]),
+    ]
+    start = time.time()
+    Manager("manager", context, instruments, "timer").main()
+    context.term()
+    assert 0.5 <= time.time() - start < 2
+
+
+def feed(watchdog_configuration, temperature_rate, power):
+    # Samples every 0.05 s for 1 s from 40 °C, returns the descriptions of the trips
+    configuration = process_configuration(
+        {"instruments": ["watchdog"], "watchdog": watchdog_configuration}
+    )
+    watchdog = Watchdog("watchdog", zmq.Context.instance(), configuration["watchdog"])
+    watchdog.set_state("running")
+    events = []
+    watchdog.send_event = lambda **kwargs: events.append(kwargs["description"])
+    start = time.time()
+    for i in range(21):
+        sample_time = start + 0.05 * i
+        body = {
+            "Time": datetime.datetime.fromtimestamp(sample_time).isoformat(),
+            "Temperature CPU Package": 40 + temperature_rate * 0.05 * i,
+            "Power CPU Package": power,
+        }
+        watchdog.process_data_message({"body": body})
+    return events
+
+
+def test_rate_trip():
+    # Also when the maximum temperature is not set
+    events = feed({"max_temperature": None, "max_temperature_rate": 10}, 50, 10)
+    assert len(events) == 1
+    assert events[0].startswith("Temperature rising at 50.0 K/s")
+
+
+def test_power_trip():
+    events = feed({"max_power": 100}, 0, 150)
+    assert events == ["Power 150.0 W above limit of 100 W"]
+
+
+@pytest.mark.parametrize(
+    "limit, temperature_rate, power",
+    [
+        ("max_temperature", 100, 10),
+        ("max_temperature_rate", 50, 10),
+        ("max_power", 0, 150),
+    ],
+)
+def test_null_limit(limit, temperature_rate, power):
+    # Only the violated limit is set to None, the others are loose
+    configuration = {
+        "max_temperature": 200,
+        "max_temperature_rate": 200,
+        "max_power": 200,
+        limit: None,
+    }
+    assert feed(configuration, temperature_rate, power) == []